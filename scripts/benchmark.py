@@ -0,0 +1,297 @@
+'''
+Benchmarks for the track update pipeline on synthetic UCSC shaped data
+
+engines (default) - convert one genePred shaped .txt.gz with every engine in track_update.ENGINES, and with the
+schema engine row by row (ucsc_schema.write_insert_statements) to check its chunk at a time path writes the same
+SQL, and report rows/sec for each. Single threaded gzip decompression is a floor all engines share, so the speed
+up is also given with it taken out
+
+pipeline - write a synthetic goldenPath (table .sql and .txt.gz files, trackDb and hgFindSpec with
+--trackdb-entries entries), serve it from a local HTTP server standing in for hgdownload and time every stage
+of the generic and gencode profiles of track_update.py against it. Each track goes through
+track_update.process_track as the script runs it, and every stage it records with instrument is reported:
+downloads, insert generation, trackDb matching, hgFindSpec filtering, source checksums and writing run.sh
+
+--json writes the results to a file so runs can be compared
+
+Example
+python scripts/benchmark.py --rows 1000000
+python scripts/benchmark.py --suite pipeline --rows 1000000 --trackdb-entries 5000 --json pipeline.json
+'''
+
+import argparse
+import contextlib
+import functools
+import gzip
+import http.server
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+
+import gzip_io
+import instrument
+import mirror_cache
+import track_update
+import ucsc_schema
+
+# column kinds of the synthetic genePred table, for the schema engine
+SYNTHETIC_KINDS = [ucsc_schema.NUMBER] + [ucsc_schema.STRING] * 3 + [ucsc_schema.NUMBER] * 5 + [ucsc_schema.STRING] * 2 + [ucsc_schema.NUMBER] + [ucsc_schema.STRING] * 4
+
+# CREATE TABLE of the synthetic genePred tables, as UCSC writes them
+SYNTHETIC_SQL = '''DROP TABLE IF EXISTS `{table_name}`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `{table_name}` (
+  `bin` smallint(5) unsigned NOT NULL,
+  `name` varchar(255) NOT NULL,
+  `chrom` varchar(255) NOT NULL,
+  `strand` char(1) NOT NULL,
+  `txStart` int(10) unsigned NOT NULL,
+  `txEnd` int(10) unsigned NOT NULL,
+  `cdsStart` int(10) unsigned NOT NULL,
+  `cdsEnd` int(10) unsigned NOT NULL,
+  `exonCount` int(10) unsigned NOT NULL,
+  `exonStarts` longblob NOT NULL,
+  `exonEnds` longblob NOT NULL,
+  `score` int(11) DEFAULT NULL,
+  `name2` varchar(255) NOT NULL,
+  `cdsStartStat` enum('none','unk','incmpl','cmpl') NOT NULL,
+  `cdsEndStat` enum('none','unk','incmpl','cmpl') NOT NULL,
+  `exonFrames` longblob NOT NULL,
+  KEY `chrom` (`chrom`,`bin`),
+  KEY `name` (`name`),
+  KEY `name2` (`name2`)
+) ENGINE=MyISAM DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+'''
+
+SYNTHETIC_DB = "hgBench"
+SYNTHETIC_TRACK = "benchGene"
+SYNTHETIC_GENCODE_VERSION = "99"
+
+
+def write_synthetic_table(path_to_txt_gz, rows, seed=0):
+    '''
+    write a gzipped genePred style table (like wgEncodeGencodeCompV*) with the given number of rows
+    '''
+    rng = random.Random(seed)
+    with gzip.open(path_to_txt_gz, 'wt', compresslevel=1) as f:
+        for i in range(rows):
+            start = rng.randrange(0, 248_000_000)
+            exon_count = rng.randrange(1, 12)
+            exon_starts = ','.join(str(start + 1000 * e) for e in range(exon_count)) + ','
+            exon_ends = ','.join(str(start + 1000 * e + 200) for e in range(exon_count)) + ','
+            f.write('\t'.join([
+                str(rng.randrange(585, 9000)), f"ENST{i:011d}.1", f"chr{rng.randrange(1, 23)}", rng.choice('+-'),
+                str(start), str(start + 1000 * exon_count), str(start + 50), str(start + 900 * exon_count),
+                str(exon_count), exon_starts, exon_ends, '0', f"GENE{i % 60000}", 'cmpl', 'cmpl', '0,' * exon_count,
+            ]) + '\n')
+
+
+def synthetic_entry_names(table_names, entries):
+    '''
+    table_names padded with filler tracks to entries names, in a fixed shuffled order
+    '''
+    names = list(table_names) + [f"benchFiller{i}" for i in range(max(entries - len(table_names), 0))]
+    random.Random(0).shuffle(names)
+    return names
+
+
+def write_synthetic_trackDb(path_to_txt_gz, table_names, entries):
+    '''
+    write a trackDb.txt.gz with an entry for each of table_names among entries entries in total
+
+    Each entry is a row of 21 columns whose html and settings run over several lines, ending in a blank line
+    '''
+    html = "<H2>Description</H2>\\\n<P>Synthetic track</P>\\\n" * 10
+    with gzip.open(path_to_txt_gz, 'wt', compresslevel=1) as f:
+        for name in synthetic_entry_names(table_names, entries):
+            columns = [name, f"{name} label", "genePred", f"{name} long label", "1", "1", "0", "0", "0", "0", "0", "0",
+                       "0", "0", "0", "", "", html, "genes", "1"]
+            f.write('\t'.join(columns) + f"\ttrack {name}\\\n")
+            f.write(f"shortLabel {name} label\\\n")
+            f.write(f"longLabel {name} long label\\\n")
+            f.write("type genePred\\\n")
+            f.write("\n")
+
+
+def write_synthetic_hgFindSpec(path_to_txt_gz, table_names, entries):
+    '''
+    write an hgFindSpec.txt.gz with a search for each of table_names among entries searches in total
+    '''
+    with gzip.open(path_to_txt_gz, 'wt', compresslevel=1) as f:
+        for name in synthetic_entry_names(table_names, entries):
+            f.write('\t'.join([name, name, "exact", "genePred", "0", "^ENST[0-9]+", "", "", "", "1.0", f"{name} search", ""]) + '\n')
+
+
+def write_synthetic_database(path_to_database, table_names, rows, trackdb_entries):
+    '''
+    write a goldenPath <db>/database directory holding table_names (genePred tables of rows rows) and trackDb/hgFindSpec
+    '''
+    os.makedirs(path_to_database, exist_ok=True)
+    for seed, table_name in enumerate(table_names):
+        with open(f"{path_to_database}/{table_name}.sql", 'w') as f:
+            f.write(SYNTHETIC_SQL.format(table_name=table_name))
+        write_synthetic_table(f"{path_to_database}/{table_name}.txt.gz", rows, seed)
+    write_synthetic_trackDb(f"{path_to_database}/trackDb.txt.gz", table_names, trackdb_entries)
+    write_synthetic_hgFindSpec(f"{path_to_database}/hgFindSpec.txt.gz", table_names, trackdb_entries)
+
+
+@contextlib.contextmanager
+def serve_directory(path):
+    '''
+    serve path over HTTP on a free local port for the duration of the block and yield its URL
+    '''
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=path))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def time_engine(engine, path_to_txt_gz, path_to_output, batch_rows):
+    '''
+    convert path_to_txt_gz with one engine and return (rows, seconds)
+    '''
+    start = time.perf_counter()
+    if engine == 'schema':
+        with open(path_to_output, 'wb', buffering=track_update.WRITE_BUFFER_SIZE) as outfile:
+            rows = ucsc_schema.write_table_insert_statements(outfile, path_to_txt_gz, 'benchTable', SYNTHETIC_KINDS, batch_rows)
+    elif engine == 'schema-rows':
+        with open(path_to_output, 'wb', buffering=track_update.WRITE_BUFFER_SIZE) as outfile:
+            rows = ucsc_schema.write_insert_statements(outfile, ucsc_schema.iter_raw_rows(path_to_txt_gz), 'benchTable', SYNTHETIC_KINDS, batch_rows)
+    else:
+        with open(path_to_output, 'w', buffering=track_update.WRITE_BUFFER_SIZE) as outfile:
+            rows = track_update.write_insert_statements(outfile, 'benchTable', track_update.read_table_rows(path_to_txt_gz), batch_rows)
+    return rows, time.perf_counter() - start
+
+
+def run_engines(args):
+    '''
+    the engines suite, returns its results
+    '''
+    results = {"engines": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        path_to_txt_gz = f"{tmp}/benchTable.txt.gz"
+        print(f"Writing {args.rows} synthetic rows")
+        write_synthetic_table(path_to_txt_gz, args.rows)
+
+        rates = {}
+        for engine in track_update.ENGINES + ('schema-rows',):
+            rows, elapsed = time_engine(engine, path_to_txt_gz, f"{tmp}/{engine}.sql", args.batch_rows)
+            rates[engine] = rows / elapsed
+            results["engines"][engine] = {"rows": rows, "seconds": elapsed, "rows_per_sec": rates[engine]}
+            print(f"{engine:>11}: {rows} rows in {elapsed:.2f}s ({rates[engine]:.0f} rows/sec)")
+
+        start = time.perf_counter()
+        for _ in gzip_io.read_chunks(path_to_txt_gz):
+            pass
+        decompress = time.perf_counter() - start
+        results["decompression_seconds"] = decompress
+        print(f"decompression alone: {decompress:.2f}s")
+
+        with open(f"{tmp}/schema.sql", 'rb') as chunks, open(f"{tmp}/schema-rows.sql", 'rb') as rows:
+            if chunks.read() != rows.read():
+                raise SystemExit("the schema engine wrote different SQL chunk at a time and row by row")
+        print(f"schema engine speed up over line: {rates['schema'] / rates['line']:.1f}x")
+        print(f"schema engine speed up over row by row: {rates['schema'] / rates['schema-rows']:.1f}x")
+        conversion = {engine: args.rows / rates[engine] - decompress for engine in rates}
+        print(f"schema engine speed up over row by row excluding decompression: {conversion['schema-rows'] / max(conversion['schema'], 1e-9):.1f}x")
+    return results
+
+
+def run_profile_pipeline(profile_name, name, base_path, args):
+    '''
+    run one synthetic track of profile_name through track_update.process_track from the current directory, as
+    track_update.py would with the benchmark settings, and return the stage records it left (instrument.collect)
+    '''
+    track_args = track_update.parse_args([
+        profile_name, "-t" if profile_name == 'generic' else "-g", name, "-d", SYNTHETIC_DB, "--dbms", "mariadb",
+        "--base-path", base_path, "--workers", str(args.workers), "--engine", args.engine, "--batch-rows", str(args.batch_rows),
+        "--decompressor", args.decompressor, "--no-cache",
+    ])
+    instrument.collect() # only this pipelines stages
+    mirror_cache.configure_from_args(track_args)
+    with instrument.stage("download organism files", database=SYNTHETIC_DB):
+        track_update.get_organism_files(SYNTHETIC_DB, base_path, args.workers)
+    track_update.process_track(track_args.name, SYNTHETIC_DB, track_args)
+    return instrument.collect()
+
+
+def run_pipeline(args):
+    '''
+    the pipeline suite, returns its results
+    '''
+    gencode_tables = [f"wgEncodeGencode{kind}V{SYNTHETIC_GENCODE_VERSION}" for kind in ("Comp", "Basic", "PseudoGene")]
+    table_names = [SYNTHETIC_TRACK] + gencode_tables
+    results = {"pipelines": {}}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Writing {len(table_names)} synthetic tables of {args.rows} rows and {args.trackdb_entries} trackDb/hgFindSpec entries")
+        write_synthetic_database(f"{tmp}/goldenPath/{SYNTHETIC_DB}/database", table_names, args.rows, args.trackdb_entries)
+
+        with serve_directory(f"{tmp}/goldenPath") as base_path:
+            for script, name, tables in (("generic", SYNTHETIC_TRACK, [SYNTHETIC_TRACK]), ("gencode", SYNTHETIC_GENCODE_VERSION, gencode_tables)):
+                # each pipeline starts from an empty UCSC_files so nothing is reused between them
+                os.makedirs(f"{tmp}/{script}/UCSC_files")
+                os.chdir(f"{tmp}/{script}")
+                try:
+                    stages = run_profile_pipeline(script, name, base_path, args)
+                finally:
+                    os.chdir(cwd)
+                rows = args.rows * len(tables)
+                total = sum(record["wall_seconds"] for record in stages)
+                results["pipelines"][script] = {"tables": len(tables), "rows": rows, "stages": stages, "total_seconds": total}
+                print(f"{script}: {rows} rows in {len(tables)} tables, {total:.2f}s in total ({rows / total:.0f} rows/sec)")
+                print(instrument.summary(stages))
+    return results
+
+
+def main(args):
+    '''
+    run the benchmarks
+    '''
+    gzip_io.set_decompressor(args.decompressor)
+    print(f"Decompressing with {gzip_io.get_decompressor()}")
+    results = {
+        "settings": {"suite": args.suite, "rows": args.rows, "trackdb_entries": args.trackdb_entries, "batch_rows": args.batch_rows, "engine": args.engine, "decompressor": gzip_io.get_decompressor()},
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if args.suite in ('engines', 'all'):
+        results.update(run_engines(args))
+    if args.suite in ('pipeline', 'all'):
+        results.update(run_pipeline(args))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"Results written to: {args.json}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--suite", choices=('engines', 'pipeline', 'all'), default='engines', help="what to benchmark, see the top of this file")
+    parser.add_argument("--rows", type=int, default=200_000, help="rows in each synthetic table")
+    parser.add_argument("--trackdb-entries", type=int, default=2000, help="entries in the synthetic trackDb and hgFindSpec (pipeline suite)")
+    parser.add_argument("--batch-rows", type=int, default=1, help="rows per INSERT statement (as in track_update.py)")
+    parser.add_argument("--engine", choices=track_update.ENGINES, default='schema', help="insert engine used by the pipeline suite")
+    parser.add_argument("--workers", type=int, default=4, help="parallel downloads in the pipeline suite")
+    parser.add_argument("--decompressor", choices=gzip_io.DECOMPRESSORS, default='auto', help="how the .txt.gz files are read (as in track_update.py)")
+    parser.add_argument("--json", help="write the results to this JSON file")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,137 @@
+'''
+Record of how every generated SQL file in a track directory was built
+
+build_manifest.json in the track directory maps each output (eg. knownGene_inserts.sql) to the size, mtime and
+sha256 of the .txt.gz it was generated from and the generator settings used. An output is only reused when the
+file exists and both still match, so a new download or a different --batch-rows regenerates it.
+
+Outputs are written to <output>.tmp and renamed into place only when complete, and the manifest entry is
+recorded after the rename. A run that crashes part way through never leaves a file that looks finished.
+
+The row count and checksum of each .txt.gz that verify.py checks the loaded tables against are kept under
+"checksums", by table, with the size and mtime of the file they were computed from.
+'''
+
+import contextlib
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = "build_manifest.json"
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    '''
+    open path.tmp for writing and rename it to path when the block finishes without an error
+    '''
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def file_sha256(path):
+    '''
+    sha256 hex digest of a file
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path_to_files):
+    '''
+    return the build manifest of a track directory ({} if there is none yet)
+    '''
+    try:
+        with open(f"{path_to_files}/{MANIFEST_NAME}", 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path_to_files, manifest):
+    '''
+    write the build manifest of a track directory atomically
+    '''
+    with atomic_write(f"{path_to_files}/{MANIFEST_NAME}") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def is_output_current(path_to_files, output_name, path_to_source, settings):
+    '''
+    True if output_name exists and was built from the current path_to_source with the same settings
+
+    The sha256 of the source is only computed when its size or mtime no longer match, so a file that was
+    downloaded again unchanged is still recognised
+    '''
+    entry = load_manifest(path_to_files).get(output_name)
+    if entry is None or not os.path.exists(f"{path_to_files}/{output_name}") or entry.get("settings") != settings:
+        return False
+
+    stat = os.stat(path_to_source)
+    source = entry.get("source", {})
+    if source.get("size") == stat.st_size and source.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    if source.get("size") == stat.st_size and source.get("sha256") == file_sha256(path_to_source):
+        record_output(path_to_files, output_name, path_to_source, settings, source["sha256"])
+        return True
+    return False
+
+
+def record_output(path_to_files, output_name, path_to_source, settings, sha256=None):
+    '''
+    note in the manifest that output_name has been built from path_to_source with settings
+    '''
+    stat = os.stat(path_to_source)
+    manifest = load_manifest(path_to_files)
+    manifest[output_name] = {
+        "source": {
+            "path": os.path.basename(path_to_source),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256 or file_sha256(path_to_source),
+        },
+        "settings": settings,
+    }
+    save_manifest(path_to_files, manifest)
+
+
+def get_checksum(path_to_files, table_name, path_to_source):
+    '''
+    the {"rows", "checksum"} recorded for a table (see verify.py), None if none was recorded for the current path_to_source
+    '''
+    entry = load_manifest(path_to_files).get("checksums", {}).get(table_name)
+    if entry is None or not os.path.exists(path_to_source):
+        return None
+    stat = os.stat(path_to_source)
+    if entry["source"].get("size") != stat.st_size or entry["source"].get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return entry
+
+
+def record_checksum(path_to_files, table_name, path_to_source, rows, checksum):
+    '''
+    note in the manifest the row count and checksum of the rows of path_to_source, the .txt.gz of table_name
+    '''
+    stat = os.stat(path_to_source)
+    manifest = load_manifest(path_to_files)
+    manifest.setdefault("checksums", {})[table_name] = {
+        "source": {
+            "path": os.path.basename(path_to_source),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        },
+        "rows": rows,
+        "checksum": checksum,
+    }
+    save_manifest(path_to_files, manifest)
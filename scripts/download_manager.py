@@ -0,0 +1,222 @@
+'''
+Parallel, resumable downloads of UCSC goldenPath files over HTTP(S)
+
+Remote file names are taken from the directory listing of the database directory and matched against shell style
+patterns (eg. wgEncodeGencode*V41*), the same wildcards that were passed to wget and rsync. Each file is fetched
+by one of a bounded pool of worker threads:
+
+- files whose local size and mtime already match the server are skipped (like wget --timestamping)
+- data is written to <file>.part and an interrupted transfer is resumed with an HTTP Range request
+- the finished file is checked against the size reported by the server, and against md5sum.txt when the
+  directory publishes one, before it is renamed into place with the remote mtime
+
+base_path can point at any HTTP server laid out like goldenPath (eg. python -m http.server over a local copy).
+'''
+
+import fnmatch
+import hashlib
+import html
+import http.client
+import os
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+UCSC_BASE_PATH = "https://hgdownload.soe.ucsc.edu/goldenPath"
+
+# number of files transferred at once
+DEFAULT_WORKERS = 4
+
+# attempts per file before giving up, each one resuming from the partial file
+DEFAULT_RETRIES = 3
+
+CHUNK_SIZE = 1024 * 1024
+TIMEOUT = 60
+
+
+def to_https(url):
+    '''
+    the https:// URL of an ftp:// one (hgdownload serves the same paths over both), any other URL as it is
+
+    Files are listed and fetched with HTTP requests only, which an FTP server does not answer
+    '''
+    if url.lower().startswith('ftp://'):
+        return 'https://' + url[len('ftp://'):]
+    return url
+
+
+def list_remote_files(directory_url):
+    '''
+    return the file names in an HTTP directory listing (as served by hgdownload)
+    '''
+    with urllib.request.urlopen(directory_url, timeout=TIMEOUT) as response:
+        listing = response.read().decode('utf-8', errors='replace')
+
+    names = []
+    for href in re.findall(r'href="([^"]+)"', listing):
+        name = urllib.parse.unquote(html.unescape(href))
+        if name.startswith(('?', '/', '.')) or '/' in name or name in names:
+            continue
+        names.append(name)
+    return names
+
+
+def get_remote_checksums(directory_url, remote_files):
+    '''
+    return {file name: md5} from md5sum.txt if the directory has one, otherwise an empty dict
+    '''
+    if 'md5sum.txt' not in remote_files:
+        return {}
+    with urllib.request.urlopen(f"{directory_url}/md5sum.txt", timeout=TIMEOUT) as response:
+        lines = response.read().decode('utf-8', errors='replace').splitlines()
+
+    checksums = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 2:
+            checksums[parts[1].lstrip('*')] = parts[0]
+    return checksums
+
+
+def get_remote_stat(url):
+    '''
+    return (size, mtime) of the remote file from a HEAD request. Either can be None if the server does not say
+    '''
+    request = urllib.request.Request(url, method='HEAD')
+    with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+        size = response.headers.get('Content-Length')
+        last_modified = response.headers.get('Last-Modified')
+
+    size = int(size) if size is not None else None
+    mtime = parsedate_to_datetime(last_modified).timestamp() if last_modified else None
+    return size, mtime
+
+
+def is_up_to_date(path, size, mtime):
+    '''
+    True if the local file has the same size and (to the second) mtime as the remote one
+    '''
+    if not os.path.exists(path) or size is None or mtime is None:
+        return False
+    stat = os.stat(path)
+    return stat.st_size == size and int(stat.st_mtime) == int(mtime)
+
+
+def file_md5(path):
+    '''
+    md5 hex digest of a local file
+    '''
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def transfer(url, partial_path):
+    '''
+    fetch url into partial_path, continuing from the end of partial_path if the server supports ranges
+
+    Raises http.client.IncompleteRead when the body ends before its Content-Length, keeping what was received
+    '''
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header('Range', f"bytes={offset}-")
+
+    try:
+        response = urllib.request.urlopen(request, timeout=TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code != 416: # range not satisfiable, the partial file is already complete
+            raise
+        return
+
+    with response:
+        mode = 'ab' if response.status == 206 else 'wb'
+        length = response.headers.get('Content-Length')
+        received = 0
+        with open(partial_path, mode) as out:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                out.write(chunk)
+                received += len(chunk)
+        # read(n) returns b'' when the connection drops early instead of raising, the retry resumes from here
+        if length is not None and received < int(length):
+            raise http.client.IncompleteRead(b'', int(length) - received)
+
+
+def download_file(url, outfile_path, expected_md5=None, retries=DEFAULT_RETRIES, remote_stat=None):
+    '''
+    download a single file with resume and verification. Returns "skipped" or "downloaded"
+
+    remote_stat - (size, mtime) when the caller has already asked the server
+    '''
+    size, mtime = remote_stat or get_remote_stat(url)
+    if is_up_to_date(outfile_path, size, mtime):
+        return "skipped"
+
+    partial_path = f"{outfile_path}.part"
+    if size is not None and os.path.exists(partial_path) and os.path.getsize(partial_path) > size:
+        os.remove(partial_path)
+
+    for attempt in range(1, retries + 1):
+        try:
+            transfer(url, partial_path)
+            break
+        except (OSError, http.client.HTTPException) as e: # includes urllib.error.URLError and a body cut short (IncompleteRead)
+            if attempt == retries:
+                raise
+            print(f"Retrying {url} after error: {e}")
+            time.sleep(attempt)
+
+    received = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    if size is not None and received != size:
+        if received > size:
+            os.remove(partial_path)
+        raise ValueError(f"{url}: expected {size} bytes, got {received}")
+    if expected_md5 is not None and file_md5(partial_path) != expected_md5:
+        os.remove(partial_path)
+        raise ValueError(f"{url}: md5 does not match md5sum.txt")
+
+    os.replace(partial_path, outfile_path)
+    if mtime is not None:
+        os.utime(outfile_path, (mtime, mtime))
+    return "downloaded"
+
+
+def download_matching_files(directory_url, patterns, outfile_path, workers=DEFAULT_WORKERS, fetch=download_file):
+    '''
+    download every file in directory_url whose name matches one of the shell style patterns into outfile_path
+
+    fetch(url, outfile_path, expected_md5) gets each file, download_file or eg. mirror_cache.fetcher(...)
+    Returns the list of file names matched. Raises RuntimeError naming every file that failed
+    '''
+    remote_files = list_remote_files(directory_url)
+    checksums = get_remote_checksums(directory_url, remote_files)
+    names = [name for name in remote_files if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+    os.makedirs(outfile_path, exist_ok=True)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            name: pool.submit(fetch, f"{directory_url}/{urllib.parse.quote(name)}", f"{outfile_path}/{name}", checksums.get(name))
+            for name in names
+        }
+
+    failed = []
+    for name, future in futures.items():
+        try:
+            status = future.result()
+        except Exception as e:
+            print(f"failed: {name} ({e})")
+            failed.append(name)
+            continue
+        print(f"{status}: {name}")
+    print(f"Fetched {len(names)} files from {directory_url} in {time.perf_counter() - start:.1f}s")
+
+    if failed:
+        raise RuntimeError(f"Download failed for: {', '.join(failed)}")
+    return names
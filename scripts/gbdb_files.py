@@ -0,0 +1,209 @@
+'''
+Fetch, check and install the gbdb files of tracks whose data is a bigBed or bigWig (eg. MANE)
+
+The files of a track are those in the directory of its URL sharing the name of its data file without the
+extension, as the old wget wildcard did (eg. mane.1.0.bb plus the mane.1.0.ix/.ixx search index). Every file of
+every track is handled by one pool of worker threads:
+
+- fetched over HTTP(S) through mirror_cache like the goldenPath files (resumed, checked against the size on the
+  server and hardlinked from the cache)
+- bigBed and bigWig files are checked from their header without reading the rest: the magic number at both
+  ends of the file (a truncated download loses the one at the end), the header offsets all inside the file,
+  and the item count (bigBed) and summary read for the record
+- copied into the gbdb directory on this server unless an identical copy (size and mtime) is already there.
+  Directories we cannot write to are created and written with sudo, asking for the password once up front
+
+sync_files returns a record of every file (path in gbdb, size, header details) that track_update.py writes to
+gbdb_files.json in the track directory.
+'''
+
+import os
+import shutil
+import struct
+import subprocess
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import download_manager
+import mirror_cache
+
+GBDB_ROOT = "/gbdb"
+
+# the records of the files of a track, written next to its run.sh
+RECORD_NAME = "gbdb_files.json"
+
+BIGBED_MAGIC = 0x8789F2EB
+BIGWIG_MAGIC = 0x888FFC26
+BBI_TYPES = {BIGBED_MAGIC: "bigBed", BIGWIG_MAGIC: "bigWig"}
+BBI_EXTENSIONS = ('.bb', '.bigBed', '.bw', '.bigWig')
+
+# magic, version, zoomLevels, chromTreeOffset, fullDataOffset, fullIndexOffset, fieldCount, definedFieldCount,
+# autoSqlOffset, totalSummaryOffset, uncompressBufSize, extensionOffset (see bbiFile.h in the UCSC kent source)
+BBI_HEADER = '{}IHHQQQHHQQIQ'
+# validCount, minVal, maxVal, sumData, sumSquares
+BBI_SUMMARY = '{}Qdddd'
+
+
+def read_bbi_header(path_to_file):
+    '''
+    the header of a bigBed or bigWig file as a dict, reading only the header, summary and item count
+
+    Raises ValueError if the file is not one, or is truncated or corrupt
+    '''
+    size = os.path.getsize(path_to_file)
+    with open(path_to_file, 'rb') as f:
+        head = f.read(struct.calcsize(BBI_HEADER.format('<')))
+        if len(head) < struct.calcsize(BBI_HEADER.format('<')):
+            raise ValueError(f"{path_to_file}: too short for a bigBed/bigWig header")
+        for byte_order in '<>':
+            fields = struct.unpack(BBI_HEADER.format(byte_order), head)
+            if fields[0] in BBI_TYPES:
+                break
+        else:
+            raise ValueError(f"{path_to_file}: not a bigBed or bigWig file")
+        (magic, version, zoom_levels, chrom_tree_offset, full_data_offset, full_index_offset, field_count,
+         defined_field_count, auto_sql_offset, total_summary_offset, _, extension_offset) = fields
+
+        f.seek(size - 4)
+        if struct.unpack(f'{byte_order}I', f.read(4))[0] != magic:
+            raise ValueError(f"{path_to_file}: no end signature, the file is truncated")
+        offsets = [chrom_tree_offset, full_data_offset, full_index_offset, auto_sql_offset, total_summary_offset, extension_offset]
+        if any(offset >= size for offset in offsets) or not chrom_tree_offset or not full_data_offset or not full_index_offset:
+            raise ValueError(f"{path_to_file}: header offsets outside the file")
+
+        header = {"type": BBI_TYPES[magic], "version": version, "zoom_levels": zoom_levels}
+        if magic == BIGBED_MAGIC:
+            f.seek(full_data_offset)
+            header["item_count"] = struct.unpack(f'{byte_order}Q', f.read(8))[0]
+            header["field_count"] = field_count
+            header["defined_field_count"] = defined_field_count
+        if total_summary_offset:
+            f.seek(total_summary_offset)
+            bases_covered, min_value, max_value, _, _ = struct.unpack(BBI_SUMMARY.format(byte_order), f.read(struct.calcsize(BBI_SUMMARY.format('<'))))
+            header.update({"bases_covered": bases_covered, "min_value": min_value, "max_value": max_value})
+    return header
+
+
+def get_gbdb_dir(url, gbdb_root=GBDB_ROOT):
+    '''
+    where the file at url goes on this server, the same directory under gbdb_root as under gbdb/ on UCSC
+
+    eg. https://hgdownload.soe.ucsc.edu/gbdb/hg38/mane/mane.1.0.bb -> /gbdb/hg38/mane
+    '''
+    path = os.path.dirname(urllib.parse.urlsplit(url).path)
+    if '/gbdb/' not in f"{path}/":
+        raise ValueError(f"{url} is not under gbdb/, give the directory in gbdb to install it to")
+    return gbdb_root.rstrip('/') + '/' + f"{path}/".split('/gbdb/', 1)[1].rstrip('/')
+
+
+def list_track_files(url):
+    '''
+    the (name, url) of the files of a track, those next to url whose name starts with that of url without its extension
+    '''
+    directory_url, name = url.rsplit('/', 1)
+    stem = os.path.splitext(name)[0]
+    names = [remote_name for remote_name in download_manager.list_remote_files(directory_url) if remote_name.startswith(stem)]
+    if name not in names:
+        raise ValueError(f"{url} is not in its directory listing")
+    return [(remote_name, f"{directory_url}/{urllib.parse.quote(remote_name)}") for remote_name in names]
+
+
+def needs_sudo(path_to_dir):
+    '''
+    True if path_to_dir (or the nearest existing parent it would be created under) is not writable by us
+    '''
+    path_to_dir = os.path.abspath(path_to_dir)
+    while not os.path.exists(path_to_dir):
+        path_to_dir = os.path.dirname(path_to_dir)
+    return not os.access(path_to_dir, os.W_OK)
+
+
+def install_file(path_to_file, path_to_dir):
+    '''
+    copy path_to_file into path_to_dir keeping its mtime, replacing the old copy at once. Returns "installed" or
+    "up to date" if the same size and mtime are already there
+    '''
+    stat = os.stat(path_to_file)
+    destination = f"{path_to_dir}/{os.path.basename(path_to_file)}"
+    if download_manager.is_up_to_date(destination, stat.st_size, stat.st_mtime):
+        return "up to date"
+    if needs_sudo(path_to_dir):
+        subprocess.run(['sudo', 'mkdir', '-p', path_to_dir], check=True)
+        subprocess.run(['sudo', 'cp', '--preserve=timestamps', path_to_file, f"{destination}.tmp"], check=True)
+        subprocess.run(['sudo', 'mv', '-f', f"{destination}.tmp", destination], check=True)
+    else:
+        os.makedirs(path_to_dir, exist_ok=True)
+        shutil.copy2(path_to_file, f"{destination}.tmp")
+        os.replace(f"{destination}.tmp", destination)
+    return "installed"
+
+
+def describe(record):
+    '''
+    the header details of a file record for messages
+    '''
+    if "type" not in record:
+        return ''
+    details = f", {record['type']} v{record['version']}"
+    if "item_count" in record:
+        details += f", {record['item_count']} items"
+    return details
+
+
+def sync_file(organism_db, url, path_to_downloads, path_to_gbdb_dir):
+    '''
+    fetch one file into path_to_downloads, check it if it is a bigBed/bigWig and install it into path_to_gbdb_dir
+
+    Returns its record and what was done (eg. "downloaded, installed")
+    '''
+    name = urllib.parse.unquote(url.rsplit('/', 1)[1])
+    path_to_file = f"{path_to_downloads}/{name}"
+    directory = os.path.dirname(urllib.parse.urlsplit(url).path).lstrip('/')
+    fetched = mirror_cache.fetch(url, organism_db, f"{directory}/{name}", path_to_file)
+    record = {"name": name, "path_in_gbdb": f"{path_to_gbdb_dir}/{name}", "size": os.path.getsize(path_to_file), "mtime": int(os.path.getmtime(path_to_file))}
+    if name.endswith(BBI_EXTENSIONS):
+        record.update(read_bbi_header(path_to_file))
+    installed = install_file(path_to_file, path_to_gbdb_dir)
+    return record, f"{fetched}, {installed}"
+
+
+def sync_files(tracks, workers=download_manager.DEFAULT_WORKERS):
+    '''
+    fetch, check and install the files of every track, workers files at a time
+
+    tracks - [(organism_db, name, url, path to download into, gbdb directory to install into)]
+    Returns {(organism_db, name): [file records]}. Raises RuntimeError naming every file that failed
+    '''
+    jobs = []
+    for organism_db, name, url, path_to_downloads, path_to_gbdb_dir in tracks:
+        os.makedirs(path_to_downloads, exist_ok=True)
+        for _, file_url in list_track_files(url):
+            jobs.append((name, organism_db, file_url, path_to_downloads, path_to_gbdb_dir))
+
+    if any(needs_sudo(job[4]) for job in jobs):
+        subprocess.run(['sudo', '-v'], check=True) # ask for the password now rather than from every worker
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            ((organism_db, name), file_url, pool.submit(sync_file, organism_db, file_url, path_to_downloads, path_to_gbdb_dir))
+            for name, organism_db, file_url, path_to_downloads, path_to_gbdb_dir in jobs
+        ]
+
+    records = {(organism_db, name): [] for organism_db, name, _, _, _ in tracks}
+    failed = []
+    for track, file_url, future in futures:
+        try:
+            record, status = future.result()
+        except Exception as e:
+            print(f"failed: {file_url} ({e})")
+            failed.append(file_url)
+            continue
+        records[track].append(record)
+        print(f"{status}: {record['path_in_gbdb']} ({record['size']} bytes{describe(record)})")
+    print(f"Synced {len(jobs)} files of {len(tracks)} tracks in {time.perf_counter() - start:.1f}s")
+
+    if failed:
+        raise RuntimeError(f"gbdb sync failed for: {', '.join(failed)}")
+    return records
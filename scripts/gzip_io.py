@@ -0,0 +1,159 @@
+'''
+Pluggable gzip reading and writing for the UCSC table files
+
+Decompressing the .txt.gz files is the largest single cost of generating insert files for big tables (GENCODE)
+and the gzip module does it on the Python thread. open_gz reads through the first available of DECOMPRESSORS:
+
+pigz - an external pigz -dc process. pigz inflates on one core but reads, writes and checks the crc on
+       threads of its own, and all of it runs outside the Python process, leaving that free to convert rows
+isal - python-isal (pip install isal). Its igzip_threaded reader inflates with ISA-L, several times faster
+       than zlib, on a background thread
+python - the standard gzip module
+
+auto (the default) picks the first of these that is installed. set_decompressor changes the choice for the
+process. read_chunks reads a file in chunks of whole lines, for converting many rows at once with bytes
+operations (see ucsc_schema.iter_row_blocks).
+
+open_writer optionally gzip compresses generated SQL (--compress-inserts) with pigz on all cores when it is
+installed, otherwise with the gzip module. Level 1 is used: SQL compresses well even at that level and
+compression stays faster than the disk it saves.
+'''
+
+import contextlib
+import gzip
+import io
+import shutil
+import signal
+import subprocess
+
+try:
+    from isal import igzip_threaded
+except ImportError:
+    igzip_threaded = None
+
+DECOMPRESSORS = ('auto', 'pigz', 'isal', 'python')
+
+COMPRESS_LEVEL = 1
+
+# size of the pipe buffer between pigz and Python
+PIPE_BUFFER_SIZE = 1024 * 1024
+
+# bytes of decompressed data read_chunks yields at a time. Small enough to stay in the CPU cache
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+decompressor = 'auto'
+
+
+def available_decompressors():
+    '''
+    the DECOMPRESSORS that can be used here, fastest first
+    '''
+    names = []
+    if shutil.which('pigz'):
+        names.append('pigz')
+    if igzip_threaded is not None:
+        names.append('isal')
+    names.append('python')
+    return names
+
+
+def set_decompressor(name):
+    '''
+    use name (one of DECOMPRESSORS) for every open_gz in this process. Raises ValueError if it is not installed
+    '''
+    global decompressor
+    if name != 'auto' and name not in available_decompressors():
+        raise ValueError(f"{name} decompression is not available here, use one of {', '.join(available_decompressors())}")
+    decompressor = name
+
+
+def get_decompressor():
+    '''
+    the decompressor open_gz will use
+    '''
+    if decompressor == 'auto':
+        return available_decompressors()[0]
+    return decompressor
+
+
+@contextlib.contextmanager
+def open_gz(path_to_gz, mode='rb', **kwargs):
+    '''
+    open a .gz file for reading ('rb' or 'rt') with the current decompressor. kwargs go to the text wrapper (eg. encoding)
+    '''
+    name = get_decompressor()
+    if name == 'python':
+        with gzip.open(path_to_gz, mode, **kwargs) as f:
+            yield f
+        return
+    if name == 'isal':
+        with igzip_threaded.open(path_to_gz, mode, threads=1, **kwargs) as f:
+            yield f
+        return
+
+    process = subprocess.Popen(['pigz', '-dc', path_to_gz], stdout=subprocess.PIPE, bufsize=PIPE_BUFFER_SIZE)
+    f = process.stdout if 'b' in mode else io.TextIOWrapper(process.stdout, **kwargs)
+    try:
+        yield f
+    finally:
+        f.close()
+        # closing the pipe before the end of the file stops pigz with SIGPIPE, which is not an error
+        returncode = process.wait()
+    if returncode not in (0, -signal.SIGPIPE):
+        raise OSError(f"pigz failed to decompress {path_to_gz} (exit code {returncode})")
+
+
+def read_chunks(path_to_gz, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    yield bytes chunks of about chunk_size from a .gz, each made of complete lines ending in a newline
+    '''
+    remainder = b''
+    with open_gz(path_to_gz, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            end = chunk.rfind(b'\n') + 1
+            remainder = chunk[end:]
+            if end:
+                yield chunk[:end]
+    if remainder:
+        yield remainder + b'\n'
+
+
+@contextlib.contextmanager
+def open_writer(outfile, mode='wb', compress=False, **kwargs):
+    '''
+    wrap the open binary outfile for writing in mode ('wb' or 'w'), gzip compressing what is written if compress is set
+
+    kwargs go to the text wrapper (eg. encoding). outfile itself is left open
+    '''
+    process = None
+    if not compress:
+        stream = outfile
+    elif shutil.which('pigz'):
+        outfile.flush()
+        process = subprocess.Popen(['pigz', f'-{COMPRESS_LEVEL}', '-c'], stdin=subprocess.PIPE, stdout=outfile, bufsize=PIPE_BUFFER_SIZE)
+        stream = process.stdin
+    else:
+        stream = gzip.GzipFile(fileobj=outfile, mode='wb', compresslevel=COMPRESS_LEVEL)
+
+    writer = stream if 'b' in mode else io.TextIOWrapper(stream, **kwargs)
+    try:
+        yield writer
+    finally:
+        if stream is outfile:
+            if writer is not outfile:
+                writer.detach()
+        else:
+            writer.close()
+    if process is not None and process.wait() != 0:
+        raise OSError(f"pigz failed to compress (exit code {process.returncode})")
+
+
+def sql_suffix(compress):
+    '''
+    file name suffix of generated SQL files
+    '''
+    return '.sql.gz' if compress else '.sql'
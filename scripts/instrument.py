@@ -0,0 +1,196 @@
+'''
+Per stage instrumentation for the pipeline scripts
+
+main() in each script runs its stages (download, insert generation, trackDb matching ...) inside stage(name).
+Each stage records:
+
+wall_seconds - elapsed time
+cpu_seconds - user + system time of this process, all threads
+child_cpu_seconds - user + system time of finished child processes (pigz decompressing or compressing, wget)
+peak_rss_mb - the highest resident set size of the process so far (getrusage only keeps the high-water mark)
+read_bytes / written_bytes - bytes read and written by the process, all threads, from /proc/self/io. This counts
+                             network, pipe and file IO alike (None where /proc is not available)
+rows - rows processed, when the stage sets it on the record it is given
+
+The records are kept in records, appended to a JSON lines file if one is set with configure (--stats-file) and
+printed as a table by print_summary (--stats). With a profile directory (--profile) every stage is also run under
+cProfile and written to <dir>/<stage>_<labels>.prof for snakeviz or pstats. cProfile only sees the thread the stage runs on,
+not the download or decompression threads.
+'''
+
+import contextlib
+import cProfile
+import json
+import os
+import re
+import resource
+import sys
+import time
+
+records = []
+
+# the keys of a record that are not labels
+METRICS = ("rows", "wall_seconds", "cpu_seconds", "child_cpu_seconds", "peak_rss_mb", "read_bytes", "written_bytes", "pid")
+
+stats_file = None
+profile_dir = None
+
+# the stage being profiled, only one cProfile can be enabled at a time so nested stages are not profiled
+profiling = None
+
+
+def configure(path_to_stats_file=None, path_to_profile_dir=None):
+    '''
+    append each finished stage to path_to_stats_file as a JSON line and/or cProfile stages into path_to_profile_dir
+    '''
+    global stats_file, profile_dir
+    stats_file = path_to_stats_file
+    profile_dir = path_to_profile_dir
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+
+def read_io_counters():
+    '''
+    (bytes read, bytes written) by this process from /proc/self/io, (None, None) if it cannot be read
+    '''
+    counters = {}
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                key, value = line.split(':')
+                counters[key] = int(value)
+    except (OSError, ValueError):
+        return None, None
+    return counters.get('rchar'), counters.get('wchar')
+
+
+def peak_rss_mb():
+    '''
+    high-water mark of the resident set size in MB (ru_maxrss is in KB on Linux, bytes on macOS)
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def cpu_seconds(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def difference(after, before):
+    if after is None or before is None:
+        return None
+    return after - before
+
+
+def profile_path(name, labels):
+    '''
+    <profile_dir>/<name>_<labels>.prof with anything but letters, digits, - and _ replaced
+    '''
+    return f"{profile_dir}/{re.sub(r'[^A-Za-z0-9_-]+', '_', '_'.join([name, *map(str, labels.values())]))}.prof"
+
+
+@contextlib.contextmanager
+def stage(name, **labels):
+    '''
+    record the block as stage name. labels (eg. track, database) are stored with the record
+
+    yields the record, set record["rows"] in the block to report the rows processed
+    '''
+    global profiling
+    record = {"stage": name, **labels, "rows": None}
+    read_before, written_before = read_io_counters()
+    cpu_before = cpu_seconds(resource.RUSAGE_SELF)
+    child_cpu_before = cpu_seconds(resource.RUSAGE_CHILDREN)
+    profiler = None
+    if profile_dir and profiling is None:
+        profiler = cProfile.Profile()
+        profiling = name
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        wall = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            profiling = None
+        read_after, written_after = read_io_counters()
+        record.update({
+            "wall_seconds": wall,
+            "cpu_seconds": cpu_seconds(resource.RUSAGE_SELF) - cpu_before,
+            "child_cpu_seconds": cpu_seconds(resource.RUSAGE_CHILDREN) - child_cpu_before,
+            "peak_rss_mb": peak_rss_mb(),
+            "read_bytes": difference(read_after, read_before),
+            "written_bytes": difference(written_after, written_before),
+            "pid": os.getpid(),
+        })
+        if profiler is not None:
+            profiler.dump_stats(profile_path(name, labels))
+        add([record])
+
+
+def add(new_records):
+    '''
+    keep new_records and write them to the stats file. Used for stages recorded in worker processes
+    '''
+    records.extend(new_records)
+    if stats_file:
+        with open(stats_file, 'a') as f:
+            for record in new_records:
+                f.write(json.dumps(record) + '\n')
+
+
+def collect():
+    '''
+    the records of this process, clearing them. Pool workers return these for the parent to add()
+    '''
+    collected = records[:]
+    records.clear()
+    return collected
+
+
+def format_bytes(value):
+    if value is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024:
+            return f"{value:.0f}{unit}"
+        value /= 1024
+    return f"{value:.1f}TB"
+
+
+def summary(stage_records=None):
+    '''
+    the records (all of them by default) as a table with one line per stage
+    '''
+    if stage_records is None:
+        stage_records = records
+    lines = [f"{'stage':<44} {'wall':>8} {'cpu':>8} {'child':>8} {'peak rss':>9} {'read':>8} {'written':>8} {'rows':>10} {'rows/sec':>10}"]
+    for record in stage_records:
+        labels = [str(value) for key, value in record.items() if key not in METRICS]
+        name = f"{labels[0]} ({', '.join(labels[1:])})" if len(labels) > 1 else labels[0]
+        rows = record["rows"]
+        rate = f"{rows / max(record['wall_seconds'], 1e-9):.0f}" if rows is not None else '-'
+        lines.append(f"{name[:44]:<44} {record['wall_seconds']:7.2f}s {record['cpu_seconds']:7.2f}s {record['child_cpu_seconds']:7.2f}s "
+                     f"{record['peak_rss_mb']:7.0f}MB {format_bytes(record['read_bytes']):>8} {format_bytes(record['written_bytes']):>8} "
+                     f"{rows if rows is not None else '-':>10} {rate:>10}")
+    return '\n'.join(lines)
+
+
+def print_summary():
+    print(summary())
+
+
+def add_arguments(parser):
+    '''
+    the --stats, --stats-file and --profile arguments shared by the scripts
+    '''
+    parser.add_argument("--stats", action="store_true", help="print the wall time, CPU time, peak memory, IO and rows of each stage at the end")
+    parser.add_argument("--stats-file", help="append the stats of each stage to this file as JSON lines")
+    parser.add_argument("--profile", dest="profile_dir", help="run each stage under cProfile and write <stage>.prof files to this directory")
+
+
+def configure_from_args(args):
+    configure(os.path.abspath(args.stats_file) if args.stats_file else None, os.path.abspath(args.profile_dir) if args.profile_dir else None)
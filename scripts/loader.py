@@ -0,0 +1,791 @@
+'''
+Load generated track files into the database from Python instead of run.sh
+
+track_update.py (and gencode.py, general_track.py) writes a load_plan.json next to run.sh listing, for every table, the files
+run.sh would feed to the client (<table>.sql then <table>_inserts.sql, or <table>_delta.sql in diff mode) and
+the trackDb/hgFindSpec insert files. In load-data and stream plans a table is its .sql and .txt.gz, whose rows
+are sent straight from the gzip reader with executemany instead (see stream_table). The loader opens --jobs
+connections once (asking for the password once), loads the tables of one or more track directories
+concurrently over that pool and applies the trackDb and hgFindSpec entries last, once every table has loaded,
+so the browser never lists a track whose tables are not there yet. The time taken by every table is printed.
+Tables planned with their indexes deferred (track_update.py --defer-indexes) are created without their secondary
+indexes and get them once every table has loaded, with the ALTER TABLEs of all tables run concurrently over the
+same pool. Before the entries, every loaded table is checked against the row count and checksum of its .txt.gz (verify.py), a
+table that differs stops the load the same way one that failed to load does. Tables loaded from the SQL of the line engine,
+which changes the values it writes, are not checked.
+
+trackDb and hgFindSpec entries of a database are checked on temporary copies of the tables, then replaced with
+both tables locked (see load_entries, they are MyISAM so this is not a transaction). With
+--staging the tables are loaded into shadow tables (<table>__new) while the browser keeps using the live
+ones, then all the tables of a database are swapped in with one atomic RENAME TABLE (see swap_tables).
+Without it the UCSC .sql files drop and refill the live tables, which are empty while they load.
+
+Files are read as latin-1 and sent over a latin1 connection, so their bytes reach the server unchanged (the
+schema engine switches the connection to binary itself with SET NAMES binary).
+
+Needs PyMySQL or mysqlclient for MariaDB/MySQL. --sqlite loads into an SQLite database file instead, with the
+MySQL only parts of the statements translated or skipped (see to_sqlite), as a stand-in for trying out loads.
+trackDb and hgFindSpec are created from the .sql files downloaded with them when a database does not have them
+
+Example
+python scripts/loader.py UCSC_files/hg38_knownGene --user root -p --jobs 8
+'''
+
+import argparse
+import getpass
+import glob
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import build_manifest
+import gzip_io
+import instrument
+import table_diff
+import ucsc_schema
+import verify
+
+try:
+    import pymysql
+except ImportError:
+    pymysql = None
+
+try:
+    import MySQLdb
+except ImportError:
+    MySQLdb = None
+
+PLAN_NAME = "load_plan.json"
+
+DEFAULT_JOBS = 4
+
+# rows per executemany when streaming a .txt.gz, the drivers send each batch as extended INSERTs
+DEFAULT_BATCH_ROWS = 1000
+
+# batches decoded ahead of the one being sent
+STREAM_QUEUE_BATCHES = 4
+
+ENTRY_FILES = ["trackDb_inserts.sql", "hgFindSpec_inserts.sql"]
+
+# the tables the entries go into, created from the UCSC .sql downloaded with them (get_organism_files) when the
+# database does not have them yet, eg. a new --sqlite file
+ENTRY_TABLES = ["trackDb", "hgFindSpec"]
+
+# storage engines whose tables a rollback undoes changes to
+TRANSACTIONAL_ENGINES = {"InnoDB", "RocksDB", "TokuDB"}
+
+# --staging loads a table into <table>__new and keeps the table it replaces as <table>__old until the swap is done
+STAGED_SUFFIX = "__new"
+OLD_SUFFIX = "__old"
+
+# string literals, quoted identifiers and comments (which can hold a ; that does not end the statement), the
+# ; that does, and an opening quote or comment whose end is not in the text yet
+TOKEN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|/\*.*?\*/|--[^\n]*|;|['\"`]|/\*", re.DOTALL)
+
+MYSQL_ESCAPES = {'0': '\x00', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a', '%': '\\%', '_': '\\_'}
+
+LEADING_COMMENTS = re.compile(r'\A(?:\s*(?:--[^\n]*|/\*.*?\*/))*\s*', re.DOTALL)
+SQLITE_SKIPPED = re.compile(r'(SET|LOCK TABLES|UNLOCK TABLES|USE)\b|ALTER TABLE \S+\s+((DISABLE|ENABLE) KEYS|ADD\b)', re.IGNORECASE)
+DELETE_LIMIT = re.compile(r'DELETE FROM (\S+) WHERE (.*) LIMIT 1', re.DOTALL)
+
+
+def write_load_plan(path_to_files, db_name, sql_pattern, load_mode='inserts', table_actions=None, compress=False, defer_indexes=False, engine='schema'):
+    '''
+    write load_plan.json for the tables run.sh loads
+
+    sql_pattern - glob of the <table>.sql files run.sh loads (eg. *knownGene.sql)
+    table_actions - from tables_to_delta_sql_statements in diff mode, in which case every table in it is planned
+    compress - the insert files are <table>_inserts.sql.gz
+    defer_indexes - full loads create the table with <table>_create.sql and add its indexes afterwards with
+    <table>_indexes.sql, when there is one (see track_update.write_deferred_index_files)
+    engine - the track_update.py engine that wrote the insert and delta files. Tables loaded from files of the
+    line engine, which does not load the data as it is (nor did it if they are unchanged), are not verified
+    '''
+    if table_actions is None:
+        table_names = sorted(os.path.basename(path)[:-len('.sql')] for path in glob.glob(f"{path_to_files}/{sql_pattern}"))
+        table_actions = {table_name: table_diff.FULL for table_name in table_names}
+        promote_snapshot = False
+    else:
+        promote_snapshot = True
+
+    tables = []
+    for table_name, action in table_actions.items():
+        indexes = None
+        if action == table_diff.UNCHANGED:
+            files = []
+        elif action == table_diff.DELTA:
+            files = [f"{table_name}_delta.sql"]
+        elif load_mode in ('load-data', 'stream'):
+            files = [f"{table_name}.sql", f"{table_name}.txt.gz"]
+        else:
+            files = [f"{table_name}.sql", f"{table_name}_inserts{gzip_io.sql_suffix(compress)}"]
+        if defer_indexes and action == table_diff.FULL:
+            files[0] = f"{table_name}_create.sql"
+            if os.path.exists(f"{path_to_files}/{table_name}_indexes.sql"):
+                indexes = f"{table_name}_indexes.sql"
+        from_txt_gz = action == table_diff.FULL and load_mode in ('load-data', 'stream')
+        tables.append({"name": table_name, "action": action, "files": files, "indexes": indexes, "promote_snapshot": promote_snapshot and action != table_diff.UNCHANGED, "verify": engine != 'line' or from_txt_gz})
+
+    # track directories sit next to the UCSC_files/<db> directory of their database
+    entry_tables = {table_name: f"../{db_name}/{table_name}.sql" for table_name in ENTRY_TABLES}
+    plan = {"database": db_name, "load_mode": load_mode, "tables": tables, "entries": ENTRY_FILES, "entry_tables": entry_tables}
+    with open(f"{path_to_files}/{PLAN_NAME}", 'w') as f:
+        json.dump(plan, f, indent=1)
+
+
+def read_load_plan(path_to_files):
+    '''
+    the load_plan.json of a track directory
+    '''
+    with open(f"{path_to_files}/{PLAN_NAME}", 'r') as f:
+        return json.load(f)
+
+
+def iter_statements(lines):
+    '''
+    yield the SQL statements (without the ;) in an iterable of lines, which may span several lines
+    '''
+    buffer = ''
+    for line in lines:
+        buffer += line
+        if not line.rstrip().endswith(';'):
+            continue
+        start = 0
+        for match in TOKEN.finditer(buffer):
+            token = match.group()
+            if token == ';':
+                statement = buffer[start:match.start()].strip()
+                if statement:
+                    yield statement
+                start = match.end()
+            elif token in ("'", '"', '`', '/*'):
+                break # the rest of the statement is on the next lines
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def mysql_string_to_sqlite(literal):
+    '''
+    turn a MySQL string literal ('...' or "..." with backslash escapes) into an SQLite one
+
+    SQLite cannot take a NUL inside a statement, those are joined in with char(0)
+    '''
+    value = re.sub(r'\\(.)', lambda match: MYSQL_ESCAPES.get(match.group(1), match.group(1)), literal[1:-1], flags=re.DOTALL)
+    return "'" + value.replace("'", "''").replace('\x00', "' || char(0) || '") + "'"
+
+
+def create_table_to_sqlite(statement):
+    '''
+    a UCSC CREATE TABLE without indexes, table options and MySQL only column attributes
+    '''
+    lines = [line for line in statement.split('\n') if not re.match(r'\s*(UNIQUE |FULLTEXT |SPATIAL )?(KEY|INDEX)\b', line)]
+    statement = '\n'.join(lines)
+    statement = re.sub(r'\)[^)]*\Z', ')', statement) # ENGINE=MyISAM DEFAULT CHARSET=latin1
+    statement = re.sub(r'\b(enum|set)\((?:[^()\']|\'[^\']*\')*\)', 'text', statement, flags=re.IGNORECASE)
+    statement = re.sub(r"\b(unsigned|zerofill|auto_increment|on update current_timestamp|character set \w+|collate \w+|comment '[^']*')", '', statement, flags=re.IGNORECASE)
+    statement = re.sub(r'`\(\d+\)', '`', statement) # prefix lengths in a PRIMARY KEY
+    return re.sub(r',\s*\)\Z', '\n)', statement)
+
+
+def to_sqlite(statement):
+    '''
+    translate one MySQL statement from the generated files to SQLite, or None if it has no SQLite equivalent
+
+    Enough for the SQL these scripts and the UCSC .sql files contain, not MySQL in general
+    '''
+    statement = LEADING_COMMENTS.sub('', statement)
+    if not statement or SQLITE_SKIPPED.match(statement):
+        return None
+    if statement.upper().startswith('CREATE TABLE'):
+        return create_table_to_sqlite(statement)
+
+    parts = []
+    start = 0
+    for match in TOKEN.finditer(statement):
+        if match.group()[0] in '\'"':
+            parts.append(statement[start:match.start()].replace('<=>', 'IS'))
+            parts.append(mysql_string_to_sqlite(match.group()))
+            start = match.end()
+    parts.append(statement[start:].replace('<=>', 'IS'))
+    statement = ''.join(parts)
+
+    # SQLite is not usually built with DELETE ... LIMIT
+    delete = DELETE_LIMIT.fullmatch(statement)
+    if delete:
+        table, condition = delete.groups()
+        statement = f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition} LIMIT 1)'
+    return statement
+
+
+def mysql_connector(host=None, port=None, user=None, password=None, defaults_file=None):
+    '''
+    return a function opening a new MariaDB/MySQL connection with PyMySQL or mysqlclient, whichever is installed
+    '''
+    settings = {"host": host, "port": port, "user": user, "read_default_file": defaults_file}
+    settings = {key: value for key, value in settings.items() if value is not None}
+    if pymysql is not None:
+        return lambda: pymysql.connect(password=password or '', charset='latin1', **settings)
+    if MySQLdb is not None:
+        return lambda: MySQLdb.connect(passwd=password or '', charset='latin1', **settings)
+    raise RuntimeError("loading into MariaDB/MySQL needs PyMySQL or mysqlclient (pip install pymysql)")
+
+
+def sqlite_connector(path_to_db):
+    '''
+    return a function opening a new connection to an SQLite database, shareable between the loader threads
+    '''
+    return lambda: sqlite3.connect(path_to_db, timeout=600, check_same_thread=False)
+
+
+def iter_file_statements(path_to_file, translate=None):
+    '''
+    yield the statements of an .sql or .sql.gz file
+
+    translate - applied to each statement first (eg. to_sqlite), statements it returns None for are skipped
+    '''
+    opener = gzip_io.open_gz if path_to_file.endswith('.gz') else open
+    with opener(path_to_file, 'rt', encoding='latin-1', newline='') as f:
+        for statement in iter_statements(f):
+            if translate is not None:
+                statement = translate(statement)
+                if statement is None:
+                    continue
+            yield statement
+
+
+def load_file(connection, path_to_file, translate=None):
+    '''
+    run every statement of an .sql or .sql.gz file on connection and return how many were run
+
+    translate - applied to each statement first (eg. to_sqlite), statements it returns None for are skipped
+    '''
+    cursor = connection.cursor()
+    count = 0
+    for statement in iter_file_statements(path_to_file, translate):
+        cursor.execute(statement)
+        count += 1
+    cursor.close()
+    return count
+
+
+def iter_row_batches(path_to_txt_gz, batch_rows=DEFAULT_BATCH_ROWS, checksum=None):
+    '''
+    yield the rows of a .txt.gz in lists of up to batch_rows, each row a list of DB-API parameters (latin-1 strings, None for NULL)
+
+    checksum - from ucsc_schema.new_checksum, the rows are added to it on the way (see verify.py)
+    '''
+    batch = []
+    for block in ucsc_schema.iter_row_blocks(path_to_txt_gz):
+        if isinstance(block, bytes): # no escapes, so no NULLs either
+            batch.extend(line.split('\t') for line in block[:-1].decode('latin-1').split('\n'))
+            if checksum is not None:
+                ucsc_schema.add_chunk_to_checksum(checksum, block)
+        else:
+            batch.append([None if value is None else value.decode('latin-1') for value in map(ucsc_schema.unescape, block)])
+            if checksum is not None:
+                ucsc_schema.add_rows_to_checksum(checksum, [block])
+        if len(batch) >= batch_rows:
+            full = len(batch) - len(batch) % batch_rows
+            for start in range(0, full, batch_rows):
+                yield batch[start:start + batch_rows]
+            batch = batch[full:]
+    if batch:
+        yield batch
+
+
+def stream_table(connection, path_to_txt_gz, table_name, batch_rows=DEFAULT_BATCH_ROWS, checksum=None):
+    '''
+    insert every row of a .txt.gz into table_name with executemany and return the number of rows
+
+    A thread decompresses and decodes the file into a queue of at most STREAM_QUEUE_BATCHES batches while this
+    one sends them, so reading the file overlaps with the server writing the rows and nothing is written to disk.
+    That thread also adds the rows to checksum, if given (see iter_row_batches)
+    '''
+    batches = queue.Queue(maxsize=STREAM_QUEUE_BATCHES)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read_batches():
+        try:
+            for batch in iter_row_batches(path_to_txt_gz, batch_rows, checksum):
+                if not put(batch):
+                    return
+            put(None)
+        except Exception as e:
+            put(e)
+
+    reader = threading.Thread(target=read_batches, daemon=True)
+    reader.start()
+    placeholder = '?' if isinstance(connection, sqlite3.Connection) else '%s'
+    cursor = connection.cursor()
+    count = 0
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            cursor.executemany(f"INSERT INTO `{table_name}` VALUES ({', '.join([placeholder] * len(batch[0]))})", batch)
+            count += len(batch)
+    finally:
+        stop.set()
+        reader.join()
+        cursor.close()
+    return count
+
+
+def use_database(connection, db_name):
+    '''
+    switch a MariaDB/MySQL connection to db_name (an SQLite connection is a single database)
+    '''
+    if not isinstance(connection, sqlite3.Connection):
+        connection.cursor().execute(f"USE `{db_name}`")
+
+
+def staged_name(table_name):
+    '''
+    name of the shadow table a table is loaded into with --staging
+    '''
+    return f"{table_name}{STAGED_SUFFIX}"
+
+
+def retarget(table_name, new_name):
+    '''
+    return a function pointing the statements of a tables .sql and insert files at new_name instead
+    '''
+    head = re.compile(rf'((?:DROP TABLE IF EXISTS|CREATE TABLE|INSERT INTO|LOCK TABLES|ALTER TABLE|DELETE FROM)\s+)(`{re.escape(table_name)}`|{re.escape(table_name)}\b)')
+    return lambda statement: head.sub(rf'\1`{new_name}`', statement, count=1)
+
+
+def is_staged(table, staging):
+    '''
+    True if a planned table is loaded into its shadow table (full loads with --staging, deltas are applied in place)
+    '''
+    return staging and table["action"] == table_diff.FULL and bool(table["files"])
+
+
+def table_preparer(table, translate=None, staging=False):
+    '''
+    (the table the statements of a planned table go to, a function preparing each of them or None if they run as they are)
+    '''
+    steps = []
+    target_name = table["name"]
+    if is_staged(table, staging):
+        target_name = staged_name(table["name"])
+        steps.append(retarget(table["name"], target_name))
+    if translate is not None:
+        steps.append(translate)
+    if not steps:
+        return target_name, None
+
+    def prepare(statement):
+        for step in steps:
+            statement = step(statement)
+            if statement is None:
+                break
+        return statement
+
+    return target_name, prepare
+
+
+def load_table(pool, path_to_files, db_name, table, translate=None, staging=False, batch_rows=DEFAULT_BATCH_ROWS):
+    '''
+    load the files of one planned table on a connection from the pool and return (statements and rows, seconds,
+    checksum). checksum is that of a streamed .txt.gz whose checksum was not recorded yet (see verify.new_table_checksum),
+    for load_tracks to record before the table is verified, otherwise None
+
+    With staging a full load goes into the tables shadow table, left for swap_tables. Diff mode snapshots are
+    promoted by load_tracks once every table has loaded and been verified
+    '''
+    target_name, prepare = table_preparer(table, translate, staging)
+    checksum = None
+    connection = pool.get()
+    try:
+        start = time.perf_counter()
+        count = 0
+        if table["files"]:
+            use_database(connection, db_name)
+        for name in table["files"]:
+            if name.endswith('.txt.gz'):
+                if table.get("verify", True) and build_manifest.get_checksum(path_to_files, table["name"], f"{path_to_files}/{name}") is None:
+                    checksum = verify.new_table_checksum(path_to_files, table["name"])
+                count += stream_table(connection, f"{path_to_files}/{name}", target_name, batch_rows, checksum)
+            else:
+                count += load_file(connection, f"{path_to_files}/{name}", prepare)
+        connection.commit()
+        return count, time.perf_counter() - start, checksum
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        pool.put(connection)
+
+
+def build_indexes(pool, path_to_files, db_name, table, translate=None, staging=False):
+    '''
+    add the deferred indexes of one loaded table (its shadow table with staging) on a connection from the pool
+    and return the seconds taken
+    '''
+    _, prepare = table_preparer(table, translate, staging)
+    connection = pool.get()
+    try:
+        start = time.perf_counter()
+        use_database(connection, db_name)
+        load_file(connection, f"{path_to_files}/{table['indexes']}", prepare)
+        connection.commit()
+        return time.perf_counter() - start
+    finally:
+        pool.put(connection)
+
+
+def verify_loaded_table(pool, path_to_files, db_name, table, staging=False):
+    '''
+    check one loaded table (its shadow table with staging) on a connection from the pool, see verify.verify_table
+    '''
+    connection = pool.get()
+    try:
+        use_database(connection, db_name)
+        loaded_name = staged_name(table["name"]) if is_staged(table, staging) else None
+        return verify.verify_table(connection, path_to_files, table["name"], loaded_name)
+    finally:
+        pool.put(connection)
+
+
+def table_exists(connection, db_name, table_name):
+    '''
+    True if db_name has a table called table_name
+    '''
+    cursor = connection.cursor()
+    if isinstance(connection, sqlite3.Connection):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    else:
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = %s AND table_name = %s", (db_name, table_name))
+    exists = cursor.fetchone() is not None
+    cursor.close()
+    return exists
+
+
+def swap_tables(connection, db_name, table_names):
+    '''
+    replace every table in table_names with its shadow table at once and drop the old tables
+
+    MariaDB/MySQL renames them all in a single RENAME TABLE, which is atomic: queries see either every old
+    table or every new one, never a missing table. SQLite renames them one by one in a transaction
+    '''
+    use_database(connection, db_name)
+    cursor = connection.cursor()
+    renames = []
+    for table_name in table_names:
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name}{OLD_SUFFIX}`")
+        if table_exists(connection, db_name, table_name):
+            renames.append((table_name, f"{table_name}{OLD_SUFFIX}"))
+        renames.append((staged_name(table_name), table_name))
+
+    if isinstance(connection, sqlite3.Connection):
+        cursor.execute("BEGIN")
+        for old_name, new_name in renames:
+            cursor.execute(f"ALTER TABLE `{old_name}` RENAME TO `{new_name}`")
+        cursor.execute("COMMIT")
+    else:
+        cursor.execute("RENAME TABLE " + ", ".join(f"`{old_name}` TO `{new_name}`" for old_name, new_name in renames))
+
+    for table_name in table_names:
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name}{OLD_SUFFIX}`")
+    connection.commit()
+    cursor.close()
+
+
+def get_entry_table_paths(path_plans):
+    '''
+    {table: .sql} of the entry tables of the (path to files, plan) of one database, from the first plan naming each
+    '''
+    paths_to_sql = {}
+    for path_to_files, plan in path_plans:
+        for table_name, name in plan.get("entry_tables", {}).items():
+            paths_to_sql.setdefault(table_name, os.path.normpath(f"{path_to_files}/{name}"))
+    return paths_to_sql
+
+
+def check_entry_tables(connection, db_name, paths_to_sql):
+    '''
+    raise RuntimeError if an entry table is neither in the database nor can be created from its .sql file
+    '''
+    missing = [f"{db_name} has no {table_name} table and {path_to_sql} is not there to create it from"
+               for table_name, path_to_sql in paths_to_sql.items() if not os.path.exists(path_to_sql) and not table_exists(connection, db_name, table_name)]
+    if missing:
+        raise RuntimeError(", ".join(missing))
+
+
+def create_entry_tables(connection, db_name, paths_to_sql, translate=None):
+    '''
+    create the entry tables a database does not have yet from their UCSC .sql files ({table: path}, see ENTRY_TABLES)
+    '''
+    check_entry_tables(connection, db_name, paths_to_sql)
+    for table_name, path_to_sql in paths_to_sql.items():
+        if not table_exists(connection, db_name, table_name):
+            load_file(connection, path_to_sql, translate)
+            connection.commit()
+
+
+def entry_tables_transactional(connection, db_name):
+    '''
+    True if trackDb and hgFindSpec can be rolled back, ie. neither is MyISAM (or another engine without transactions)
+    '''
+    if isinstance(connection, sqlite3.Connection):
+        return True
+    cursor = connection.cursor()
+    cursor.execute("SELECT engine FROM information_schema.tables WHERE table_schema = %s AND table_name IN ('trackDb', 'hgFindSpec')", (db_name,))
+    engines = [engine for engine, in cursor.fetchall()]
+    cursor.close()
+    return all(engine in TRANSACTIONAL_ENGINES for engine in engines)
+
+
+def check_entries(connection, statements):
+    '''
+    run the entry statements on empty temporary copies of trackDb and hgFindSpec, which hide the real tables from
+    this connection, so a statement the server rejects is found before any entry is replaced
+    '''
+    cursor = connection.cursor()
+    for table_name in ENTRY_TABLES:
+        cursor.execute(f"CREATE TEMPORARY TABLE `{table_name}` LIKE `{table_name}`")
+    try:
+        for statement in statements:
+            cursor.execute(statement)
+    finally:
+        for table_name in ENTRY_TABLES:
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{table_name}`")
+        cursor.close()
+
+
+def load_entries(connection, db_name, paths_to_entries, translate=None, paths_to_sql=None):
+    '''
+    replace the trackDb and hgFindSpec entries of a database with those in the insert files and return how many statements were run
+
+    paths_to_sql - {table: .sql} to create trackDb and hgFindSpec from if the database does not have them yet
+
+    The statements are checked first (check_entries), then run with both tables locked so the browser never sees
+    some entries replaced and not others. That is one transaction only if neither table is MyISAM, as they are on
+    UCSC and GWIPS-viz: otherwise a failure part way (eg. a lost connection) leaves the entries run so far in
+    place, which running the load again puts right as every entry is deleted before it is inserted
+    '''
+    use_database(connection, db_name)
+    if paths_to_sql:
+        create_entry_tables(connection, db_name, paths_to_sql, translate)
+    statements = [statement for path_to_entries in paths_to_entries for statement in iter_file_statements(path_to_entries, translate)]
+    sqlite = isinstance(connection, sqlite3.Connection)
+    if not sqlite:
+        try:
+            check_entries(connection, statements)
+        except Exception as e:
+            raise RuntimeError(f"{db_name}: the trackDb/hgFindSpec entries were rejected ({e}), no entries were changed") from e
+    transactional = entry_tables_transactional(connection, db_name)
+
+    cursor = connection.cursor()
+    if sqlite:
+        cursor.execute("BEGIN")
+    else:
+        cursor.execute("SET autocommit = 0")
+        cursor.execute("LOCK TABLES trackDb WRITE, hgFindSpec WRITE")
+    count = 0
+    try:
+        for statement in statements:
+            cursor.execute(statement)
+            count += 1
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        if transactional:
+            raise
+        raise RuntimeError(f"{db_name}: replacing the trackDb/hgFindSpec entries failed after {count} of {len(statements)} statements ({e}). "
+                           "The tables are not transactional so those stay, load again to finish") from e
+    finally:
+        if not sqlite:
+            cursor.execute("UNLOCK TABLES")
+        cursor.close()
+    return count
+
+
+def load_tracks(paths_to_files, connect, jobs=DEFAULT_JOBS, translate=None, staging=False, batch_rows=DEFAULT_BATCH_ROWS):
+    '''
+    load the tables of every track directory, jobs at a time, then their trackDb and hgFindSpec entries
+
+    connect - function returning a new DB-API connection (mysql_connector / sqlite_connector)
+    staging - load full tables into shadow tables and swap them in together once all have loaded (see swap_tables)
+    batch_rows - rows per executemany for tables streamed from their .txt.gz
+    Returns {(db, table): seconds}. Raises RuntimeError naming the tables that failed to load or differ from their
+    .txt.gz, in which case nothing is swapped and no entries are loaded, or before anything is loaded when a
+    database has no trackDb or hgFindSpec and no .sql to create it from
+    '''
+    plans = [(path_to_files, read_load_plan(path_to_files)) for path_to_files in paths_to_files]
+    pool = queue.Queue()
+    for _ in range(jobs):
+        pool.put(connect())
+
+    timings = {}
+    try:
+        connection = pool.get()
+        try:
+            for db_name in dict.fromkeys(plan["database"] for _, plan in plans):
+                check_entry_tables(connection, db_name, get_entry_table_paths([(path_to_files, plan) for path_to_files, plan in plans if plan["database"] == db_name]))
+        finally:
+            pool.put(connection)
+
+        failed = []
+        with instrument.stage("table loading", jobs=jobs) as record, ThreadPoolExecutor(max_workers=jobs) as executor:
+            record["rows"] = 0
+            futures = {}
+            for path_to_files, plan in plans:
+                for table in plan["tables"]:
+                    future = executor.submit(load_table, pool, path_to_files, plan["database"], table, translate, staging, batch_rows)
+                    futures[future] = (path_to_files, plan["database"], table)
+            for future in as_completed(futures):
+                path_to_files, db_name, table = futures[future]
+                try:
+                    count, elapsed, checksum = future.result()
+                except Exception as e:
+                    print(f"{db_name}.{table['name']}: failed: {e}")
+                    failed.append(f"{db_name}.{table['name']}")
+                    continue
+                if checksum is not None:
+                    verify.save_table_checksum(path_to_files, table["name"], checksum)
+                timings[(db_name, table["name"])] = elapsed
+                record["rows"] += count
+                if table["files"]:
+                    print(f"{db_name}.{table['name']} ({table['action']}): {count} statements and rows in {elapsed:.2f}s")
+                else:
+                    print(f"{db_name}.{table['name']}: unchanged, skipped")
+        if failed:
+            raise RuntimeError(f"failed to load {', '.join(sorted(failed))}, trackDb and hgFindSpec were not updated")
+
+        indexed = [(path_to_files, plan["database"], table) for path_to_files, plan in plans for table in plan["tables"] if table["files"] and table.get("indexes")]
+        if indexed:
+            with instrument.stage("index building", jobs=jobs) as record, ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = {executor.submit(build_indexes, pool, path_to_files, db_name, table, translate, staging): (db_name, table["name"]) for path_to_files, db_name, table in indexed}
+                for future in as_completed(futures):
+                    db_name, table_name = futures[future]
+                    try:
+                        elapsed = future.result()
+                    except Exception as e:
+                        print(f"{db_name}.{table_name}: adding indexes failed: {e}")
+                        failed.append(f"{db_name}.{table_name}")
+                        continue
+                    timings[(db_name, table_name)] += elapsed
+                    print(f"{db_name}.{table_name}: indexes added in {elapsed:.2f}s")
+            if failed:
+                raise RuntimeError(f"failed to add the indexes of {', '.join(sorted(failed))}, trackDb and hgFindSpec were not updated")
+
+        with instrument.stage("verification", jobs=jobs) as record, ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {}
+            for path_to_files, plan in plans:
+                for table in plan["tables"]:
+                    if table["files"] and table.get("verify", True):
+                        futures[executor.submit(verify_loaded_table, pool, path_to_files, plan["database"], table, staging)] = (plan["database"], table["name"])
+            for future in as_completed(futures):
+                db_name, table_name = futures[future]
+                difference = future.result()
+                if difference:
+                    print(f"{db_name}.{table_name}: differs from its .txt.gz: {difference}")
+                    failed.append(f"{db_name}.{table_name}")
+        if failed:
+            raise RuntimeError(f"{', '.join(sorted(failed))} did not load correctly, trackDb and hgFindSpec were not updated")
+        print(f"Verified {len(futures)} tables in {record['wall_seconds']:.2f}s")
+
+        # the tables loaded in place now hold what their pending snapshots describe, staged ones once swapped in
+        for path_to_files, plan in plans:
+            for table in plan["tables"]:
+                if table["promote_snapshot"] and not is_staged(table, staging):
+                    table_diff.promote_snapshot(path_to_files, table["name"])
+
+        connection = pool.get()
+        try:
+            for db_name in dict.fromkeys(plan["database"] for _, plan in plans):
+                db_plans = [(path_to_files, plan) for path_to_files, plan in plans if plan["database"] == db_name]
+                staged = [(path_to_files, table) for path_to_files, plan in db_plans for table in plan["tables"] if is_staged(table, staging)]
+                if staged:
+                    with instrument.stage("table swap", database=db_name) as record:
+                        swap_tables(connection, db_name, [table["name"] for _, table in staged])
+                        for path_to_files, table in staged:
+                            if table["promote_snapshot"]:
+                                table_diff.promote_snapshot(path_to_files, table["name"])
+                    print(f"{db_name}: swapped in {len(staged)} tables in {record['wall_seconds']:.2f}s")
+
+                with instrument.stage("entries loading", database=db_name) as record:
+                    paths_to_entries = [f"{path_to_files}/{name}" for path_to_files, plan in db_plans for name in plan["entries"]]
+                    record["rows"] = load_entries(connection, db_name, paths_to_entries, translate, get_entry_table_paths(db_plans))
+                timings[(db_name, "trackDb/hgFindSpec")] = record["wall_seconds"]
+                print(f"{db_name}.trackDb/hgFindSpec: {record['rows']} statements in {record['wall_seconds']:.2f}s")
+        finally:
+            pool.put(connection)
+    finally:
+        while not pool.empty():
+            pool.get().close()
+    return timings
+
+
+def add_connection_arguments(parser):
+    '''
+    add the options choosing the database to load into (and how) to an argparse parser
+    '''
+    parser.add_argument("--host", help="database server (default localhost)")
+    parser.add_argument("--port", type=int, help="database server port")
+    parser.add_argument("--user", help="database user")
+    parser.add_argument("-p", "--password", action="store_true", help="ask for the password (once)")
+    parser.add_argument("--defaults-file", help="option file with the connection settings, eg. ~/.my.cnf")
+    parser.add_argument("--staging", action="store_true", help=f"load full tables into <table>{STAGED_SUFFIX} and swap them in with one RENAME TABLE once all have loaded, so the live tables are never empty")
+    parser.add_argument("--sqlite", help="load into this SQLite database file instead, to try out a load without a server")
+
+
+def connector_from_args(args):
+    '''
+    (connect, translate) for load_tracks from the options of add_connection_arguments, asking for the password here
+    '''
+    if args.sqlite:
+        return sqlite_connector(args.sqlite), to_sqlite
+    password = getpass.getpass("Database password: ") if args.password else None
+    return mysql_connector(args.host, args.port, args.user, password, args.defaults_file), None
+
+
+def main(args):
+    '''
+    load the track directories
+    '''
+    connect, translate = connector_from_args(args)
+    instrument.configure_from_args(args)
+    start = time.perf_counter()
+    try:
+        timings = load_tracks(args.paths, connect, args.jobs, translate, args.staging, args.batch_rows)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    finally:
+        if args.stats:
+            instrument.print_summary()
+    print(f"Loaded {len(timings)} tables in {time.perf_counter() - start:.2f}s")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("paths", nargs='+', help="track directories written by track_update.py (eg. UCSC_files/hg38_knownGene)")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="number of tables loaded at once (one connection each)")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS, help="rows per executemany for tables loaded from their .txt.gz (load-data and stream plans)")
+    add_connection_arguments(parser)
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,226 @@
+'''
+Local mirror of the goldenPath files the pipeline downloads, shared by every run and every track
+
+Without it each run downloads into ./UCSC_files/<db>_<track> (and ./UCSC_files/<db> for trackDb and hgFindSpec)
+under the current directory, so running from another directory, or adding another track of the same assembly,
+fetches the same multi-GB files again. With the cache configured (it is, by default, in main of track_update.py)
+every file is downloaded once into
+
+    <cache dir>/<db>/<remote mtime>/<path> (eg. ~/.cache/gwips-viz-ucsc/hg38/1690891325/database/trackDb.txt.gz)
+
+and hardlinked into the track directory, so each copy in UCSC_files takes no extra space. Files are looked up by
+(db, path, remote mtime), the mtime coming from the same HEAD request download_manager already makes, so a new
+UCSC release is a cache miss while an unchanged file is never transferred twice.
+
+index.json in the cache dir records the size and last use of every file. When the cache grows past its size
+limit the least recently used files are removed (files linked into UCSC_files stay readable there until those
+are deleted too). The index is updated under an flock, so batch workers and concurrent runs can share a cache.
+Each file has a <file>.lock of its own, held while it is downloaded and linked into place. Eviction skips files
+whose lock is held and removes the lock file along with the file. An index.json that cannot be read (eg. cut
+short by a crash) is rebuilt from the files in the cache.
+Falls back to copying when the cache and UCSC_files are on different filesystems.
+'''
+
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+import time
+
+import download_manager
+
+DEFAULT_CACHE_DIR = os.environ.get("GWIPS_UCSC_CACHE", os.path.expanduser("~/.cache/gwips-viz-ucsc"))
+
+# GiB
+DEFAULT_MAX_SIZE = 100
+
+INDEX_NAME = "index.json"
+
+# files in the cache dir that are not cached files: locks, downloads in progress and files being written
+WORK_SUFFIXES = ('.lock', '.part', '.tmp', '.link')
+
+cache_dir = None
+max_bytes = DEFAULT_MAX_SIZE * 1024**3
+
+
+def configure(path_to_cache_dir=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+    '''
+    keep downloads in path_to_cache_dir, at most max_size GiB of them. None turns the cache off
+    '''
+    global cache_dir, max_bytes
+    cache_dir = os.path.abspath(path_to_cache_dir) if path_to_cache_dir else None
+    max_bytes = int(max_size * 1024**3)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+def open_locked(path_to_lock, blocking=True):
+    '''
+    the open path_to_lock (created if missing) with an exclusive flock on it, None if not blocking and another
+    process holds it
+
+    A lock file can be removed by evict while another process waits on it, so the lock only counts once it is
+    held on the file that is still at path_to_lock
+    '''
+    while True:
+        f = open(path_to_lock, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        try:
+            if os.stat(path_to_lock).st_ino == os.fstat(f.fileno()).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+
+
+@contextlib.contextmanager
+def locked(path_to_lock):
+    '''
+    hold an exclusive flock on path_to_lock (created if missing)
+    '''
+    f = open_locked(path_to_lock)
+    try:
+        yield
+    finally:
+        f.close()
+
+
+def rebuild_index():
+    '''
+    {key: entry} of every file in the cache, for when index.json is lost. A file was last used when it was last
+    linked into a track directory, which changes its ctime
+    '''
+    index = {}
+    for path_to_dir, _, names in os.walk(cache_dir):
+        for name in names:
+            key = os.path.relpath(f"{path_to_dir}/{name}", cache_dir)
+            if name.endswith(WORK_SUFFIXES) or os.sep not in key:
+                continue
+            stat = os.stat(f"{path_to_dir}/{name}")
+            index[key] = {"size": stat.st_size, "last_used": stat.st_ctime}
+    return index
+
+
+def read_index():
+    '''
+    {key: entry} of every cached file, empty if the cache is new. Rebuilt from the cache when it cannot be read
+    '''
+    try:
+        with open(f"{cache_dir}/{INDEX_NAME}") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        print(f"{cache_dir}/{INDEX_NAME} is damaged, rebuilding it from the cached files")
+        return rebuild_index()
+
+
+def write_index(index):
+    with open(f"{cache_dir}/{INDEX_NAME}.tmp", 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(f"{cache_dir}/{INDEX_NAME}.tmp", f"{cache_dir}/{INDEX_NAME}")
+
+
+def get_key(db, path, mtime):
+    return f"{db}/{int(mtime)}/{path}"
+
+
+def evict(index, keep):
+    '''
+    remove the least recently used files from the cache until it fits in max_bytes, never the key keep nor a
+    file another process is downloading or linking (holding its lock)
+    '''
+    total = sum(entry["size"] for entry in index.values())
+    for key in sorted(index, key=lambda key: index[key]["last_used"]):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        path_to_cached_file = f"{cache_dir}/{key}"
+        lock = open_locked(f"{path_to_cached_file}.lock", blocking=False)
+        if lock is None:
+            continue
+        with lock:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path_to_cached_file)
+            os.remove(f"{path_to_cached_file}.lock")
+        total -= index.pop(key)["size"]
+        print(f"evicted from cache: {key}")
+
+
+def record_use(key, size):
+    '''
+    note that key was just used, then evict down to the size limit
+    '''
+    with locked(f"{cache_dir}/{INDEX_NAME}.lock"):
+        index = read_index()
+        index[key] = {"size": size, "last_used": time.time()}
+        evict(index, key)
+        write_index(index)
+
+
+def link_into_place(path_to_cached_file, outfile_path):
+    '''
+    hardlink the cached file to outfile_path, replacing whatever is there. Copies across filesystems
+    '''
+    if os.path.exists(outfile_path) and os.path.samefile(path_to_cached_file, outfile_path):
+        return
+    tmp_path = f"{outfile_path}.link"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(tmp_path)
+    try:
+        os.link(path_to_cached_file, tmp_path)
+    except OSError: # EXDEV, or a filesystem without hardlinks
+        shutil.copy2(path_to_cached_file, tmp_path)
+    os.replace(tmp_path, outfile_path)
+
+
+def fetch(url, db, path, outfile_path, expected_md5=None):
+    '''
+    download url (path within the db directory on the server) through the cache to outfile_path
+
+    Returns "cached" if the file was already in the cache, "downloaded" otherwise. Goes straight to
+    outfile_path when the cache is off or the server does not give a Last-Modified to key the file on
+    '''
+    remote_stat = download_manager.get_remote_stat(url)
+    size, mtime = remote_stat
+    if cache_dir is None or mtime is None:
+        return download_manager.download_file(url, outfile_path, expected_md5, remote_stat=remote_stat)
+
+    key = get_key(db, path, mtime)
+    path_to_cached_file = f"{cache_dir}/{key}"
+    os.makedirs(os.path.dirname(path_to_cached_file), exist_ok=True)
+    # one process downloads a file, any other wanting it waits and then links it. Held until the file is linked,
+    # so evict cannot remove it in between
+    with locked(f"{path_to_cached_file}.lock"):
+        status = download_manager.download_file(url, path_to_cached_file, expected_md5, remote_stat=remote_stat)
+        link_into_place(path_to_cached_file, outfile_path)
+    record_use(key, os.path.getsize(path_to_cached_file))
+    return "cached" if status == "skipped" else status
+
+
+def fetcher(db, directory):
+    '''
+    fetch for download_manager.download_matching_files of the files in <db>/<directory> on the server
+    '''
+    def fetch_file(url, outfile_path, expected_md5=None):
+        return fetch(url, db, f"{directory}/{os.path.basename(outfile_path)}", outfile_path, expected_md5)
+    return fetch_file
+
+
+def add_arguments(parser):
+    '''
+    add --cache-dir, --cache-size and --no-cache to an argparse parser
+    '''
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="where downloaded UCSC files are kept and shared between runs (default $GWIPS_UCSC_CACHE or ~/.cache/gwips-viz-ucsc)")
+    parser.add_argument("--cache-size", type=float, default=DEFAULT_MAX_SIZE, help="GiB the cache may use before the least recently used files are removed")
+    parser.add_argument("--no-cache", action="store_true", help="download straight into UCSC_files as before")
+
+
+def configure_from_args(args):
+    configure(None if args.no_cache else args.cache_dir, args.cache_size)
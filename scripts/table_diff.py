@@ -0,0 +1,213 @@
+'''
+Differential updates of UCSC tables against the release that was last loaded into GWIPS-viz
+
+For every table a snapshot of the last loaded data is kept next to its _inserts.sql:
+
+<table>.snapshot.gz - the .txt.gz that was loaded (hardlinked when possible)
+<table>.snapshot.json - row count and an order independent digest of the rows
+
+Comparing the digest of a new download with the snapshot tells in one pass whether the table changed at all.
+When it has, the rows are matched by hash to find the rows to DELETE and the rows to INSERT, so only the
+delta is sent to the database instead of dropping and reloading the table. A table is reloaded in full
+instead when its CREATE TABLE changed (the digest includes a hash of it) or it has FLOAT/DOUBLE columns, whose
+rows a DELETE cannot match exactly (see ucsc_schema.INEXACT_TYPES).
+
+A new snapshot is only staged (<table>.pending.*) when the SQL is generated. run.sh and loader.py promote
+the snapshots once every table has loaded and matched its .txt.gz (verify.py), so a failed load is diffed
+against what is really in the database.
+'''
+
+import hashlib
+import json
+import os
+import shutil
+from collections import Counter
+
+import gzip_io
+import ucsc_schema
+
+# what run.sh has to do with a table in diff mode
+UNCHANGED = 'unchanged'
+DELTA = 'delta'
+FULL = 'full'
+
+# rows are summed as 128 bit integers for the table digest
+DIGEST_MODULUS = 1 << 128
+
+
+def row_hash(line):
+    '''
+    16 byte digest of one raw row (bytes, without the trailing newline)
+    '''
+    return hashlib.blake2b(line, digest_size=16).digest()
+
+
+def iter_raw_rows(path_to_txt_gz):
+    '''
+    yield each row of a .txt.gz as bytes without the trailing newline
+
+    rows with escaped newlines in a value span several lines of the file and are yielded as one
+    '''
+    with gzip_io.open_gz(path_to_txt_gz, 'rb') as f:
+        pending = b''
+        for line in f:
+            line = pending + line
+            if line.endswith(b'\n') and ucsc_schema.ends_in_escape(line[:-1]):
+                pending = line
+                continue
+            pending = b''
+            yield line.rstrip(b'\n')
+        if pending:
+            yield pending
+
+
+def table_digest(path_to_txt_gz, checksum=None):
+    '''
+    return {"rows": n, "digest": hex} for a .txt.gz. The digest does not depend on row order
+
+    checksum - from ucsc_schema.new_checksum, the rows are added to it on the way (see verify.py)
+    '''
+    total = 0
+    rows = 0
+    for block in ucsc_schema.iter_row_blocks(path_to_txt_gz):
+        if isinstance(block, bytes):
+            lines = block[:-1].split(b'\n')
+            if checksum is not None:
+                ucsc_schema.add_chunk_to_checksum(checksum, block)
+        else:
+            lines = [b'\t'.join(block).rstrip(b'\n')]
+            if checksum is not None:
+                ucsc_schema.add_rows_to_checksum(checksum, [block])
+        for line in lines:
+            total += int.from_bytes(row_hash(line), 'big')
+        rows += len(lines)
+    return {"rows": rows, "digest": f"{total % DIGEST_MODULUS:032x}"}
+
+
+def schema_digest(path_to_sql):
+    '''
+    sha256 hex digest of the CREATE TABLE statement in a UCSC .sql file (the rest of the file holds dump dates)
+    '''
+    with open(path_to_sql, 'rb') as f:
+        create_table = f.read().split(b'CREATE TABLE', 1)[-1].split(b';', 1)[0]
+    return hashlib.sha256(create_table).hexdigest()
+
+
+def get_snapshot_paths(path_to_files, table_name, state='snapshot'):
+    '''
+    return the (data, digest) paths of a tables snapshot. state is "snapshot" or "pending"
+    '''
+    return f"{path_to_files}/{table_name}.{state}.gz", f"{path_to_files}/{table_name}.{state}.json"
+
+
+def load_snapshot_digest(path_to_files, table_name):
+    '''
+    return the digest saved with the last loaded snapshot, or None if there is no usable snapshot
+    '''
+    path_to_data, path_to_digest = get_snapshot_paths(path_to_files, table_name)
+    if not os.path.exists(path_to_data):
+        return None
+    try:
+        with open(path_to_digest, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def plan_table_update(path_to_files, table_name, checksum=None):
+    '''
+    compare <table>.txt.gz with the snapshot of its last load
+
+    returns (action, digest) where action is UNCHANGED, DELTA or FULL and digest is that of the new file. FULL
+    when there is no snapshot yet, the CREATE TABLE changed (snapshots from before the schema was part of the
+    digest count as changed) or the table has columns a DELETE cannot match on. checksum is passed on to table_digest
+    '''
+    path_to_sql = f"{path_to_files}/{table_name}.sql"
+    digest = table_digest(f"{path_to_files}/{table_name}.txt.gz", checksum)
+    digest["schema"] = schema_digest(path_to_sql)
+    snapshot_digest = load_snapshot_digest(path_to_files, table_name)
+    if snapshot_digest is None:
+        return FULL, digest
+    if snapshot_digest == digest:
+        return UNCHANGED, digest
+    if snapshot_digest.get("schema") != digest["schema"]:
+        return FULL, digest
+    if any(column_type in ucsc_schema.INEXACT_TYPES for _, column_type in ucsc_schema.parse_create_table(path_to_sql)):
+        return FULL, digest
+    return DELTA, digest
+
+
+def stage_snapshot(path_to_files, table_name, digest):
+    '''
+    keep the new .txt.gz and its digest as <table>.pending.* until run.sh has loaded it
+    '''
+    path_to_data, path_to_digest = get_snapshot_paths(path_to_files, table_name, 'pending')
+    if os.path.exists(path_to_data):
+        os.remove(path_to_data)
+    try:
+        os.link(f"{path_to_files}/{table_name}.txt.gz", path_to_data)
+    except OSError:
+        shutil.copyfile(f"{path_to_files}/{table_name}.txt.gz", path_to_data)
+    with open(path_to_digest, 'w') as f:
+        json.dump(digest, f)
+
+
+def promote_snapshot_commands(path_to_files, table_name):
+    '''
+    bash lines that make the pending snapshot of a table the loaded one
+    '''
+    pending_data, pending_digest = get_snapshot_paths(path_to_files, table_name, 'pending')
+    snapshot_data, snapshot_digest = get_snapshot_paths(path_to_files, table_name)
+    return f'mv -f "{pending_data}" "{snapshot_data}" && mv -f "{pending_digest}" "{snapshot_digest}"\n'
+
+
+def promote_snapshot(path_to_files, table_name):
+    '''
+    make the pending snapshot of a table the loaded one, as promote_snapshot_commands does in run.sh
+    '''
+    pending_data, pending_digest = get_snapshot_paths(path_to_files, table_name, 'pending')
+    snapshot_data, snapshot_digest = get_snapshot_paths(path_to_files, table_name)
+    os.replace(pending_data, snapshot_data)
+    os.replace(pending_digest, snapshot_digest)
+
+
+def count_row_hashes(path_to_txt_gz):
+    '''
+    Counter of row hash -> number of occurrences in a .txt.gz
+    '''
+    return Counter(row_hash(line) for line in iter_raw_rows(path_to_txt_gz))
+
+
+def iter_deleted_rows(path_to_snapshot, new_counts):
+    '''
+    yield the raw rows (bytes) of the snapshot that are not in the new file
+
+    new_counts (from count_row_hashes on the new file) is used up by the rows that are in both,
+    leaving only the rows to insert for iter_inserted_rows
+    '''
+    for line in iter_raw_rows(path_to_snapshot):
+        digest = row_hash(line)
+        if new_counts[digest] > 0:
+            new_counts[digest] -= 1
+        else:
+            yield line
+
+
+def iter_inserted_rows(path_to_txt_gz, new_counts):
+    '''
+    yield the raw rows (bytes) of the new file left in new_counts by iter_deleted_rows
+    '''
+    for line in iter_raw_rows(path_to_txt_gz):
+        digest = row_hash(line)
+        if new_counts[digest] > 0:
+            new_counts[digest] -= 1
+            yield line
+
+
+def delete_statement(table_name, column_names, row):
+    '''
+    DELETE one copy of a row (list of values), matching every column. Values are quoted the same way as the
+    line engine. The schema engine builds its own with ucsc_schema.row_to_condition
+    '''
+    conditions = ' AND '.join(f'`{column}`="{value.replace(chr(34), "")}"' for column, value in zip(column_names, row))
+    return f'DELETE FROM `{table_name}` WHERE {conditions} LIMIT 1;\n'
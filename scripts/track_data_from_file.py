@@ -2,106 +2,28 @@
 This script is a quick way to deal with tracks whos data is stored in big beds rather than available via .txt.gz
 Example MANE
 
-Download the bb file "wget ftp://hgdownload.soe.ucsc.edu/gbdb/hg38/mane/mane.1.0.bb"
+-u is the URL of the bb file, eg. https://hgdownload.soe.ucsc.edu/gbdb/hg38/mane/mane.1.0.bb. It is downloaded
+for you over HTTPS, an ftp:// URL is fetched from the same host and path over HTTPS instead
 
+Runs the bigbed profile of track_update.py with the original arguments (and run.sh asking for the password).
+The database and table names are taken from the name of the directory general_track.py wrote to -p
+(UCSC_files/<db>_<table>). Use track_update.py bigbed --manifest to register many tracks at once
 '''
 
 import argparse
-import os 
-import subprocess
+import os
 
-
-def get_file_from_url(url, path_to_files, path_to_organismDb_in_gbdb):
-    '''
-    download the data file from the provided url with wget
-    '''
-    if not os.path.exists(path_to_organismDb_in_gbdb):
-        subprocess.run(['sudo', 'mkdir', '-P', path_to_organismDb_in_gbdb])
-    
-    url = '.'.join(url.split('.')[:-1]) #remove extension from URL so * can be added
-    url = "ftp:" + ':'.join(url.split(':')[1:]) # ensure link is ftp so we can use wildcards (*)
-    os.chdir(path_to_files)
-    subprocess.run(['sudo', 'wget', '--timestamping', url + "*", '-P', path_to_organismDb_in_gbdb])
-    os.chdir("../..")
-
-
-def get_table_name_from_hgFindSpec(path_to_track_files):
-    '''
-    check hgFindSpec inserts and the provided path and return the name of the table to be created
-    '''
-
-    with open(path_to_track_files + 'hgFindSpec_inserts.sql', 'r') as f:
-        line = f.readline()
-        insert_values = line.split('(')[1]
-        table_name = insert_values.split(',')[0]
-        return table_name.replace('"', '')
-
-
-def create_table(path_to_files, table_name):
-    '''
-    Write the table creation from the template below
-    '''
-    with open(f'{path_to_files}/{table_name}.sql', 'w') as f:
-        f.write(f"""
-
-
-DROP TABLE IF EXISTS `{table_name}`;
-/*!40101 SET @saved_cs_client     = @@character_set_client */;
-/*!40101 SET character_set_client = utf8 */;
-CREATE TABLE `{table_name}` (
-  `filename` varchar(255)
-) ENGINE=MyISAM DEFAULT CHARSET=latin1;
-        
-        
-        """)
-    return f'{path_to_files}/{table_name}.sql'
+import track_update
 
 
-def write_table_inserts(table_name, path_in_gbdb_to_file, outpath_to_files):
+def get_db_and_table_name(path_to_track_files):
     '''
-    Insert into the track table the path to the data file 
+    the database and table of the track files general_track.py wrote to path_to_track_files
     '''
-    with open(f"{outpath_to_files}/{table_name}_inserts.sql", 'w') as f:
-        f.write(f"""
-INSERT INTO {table_name} VALUES ('{path_in_gbdb_to_file}');
-        """)
-    if outpath_to_files[-1] == '/':
-        return f"{outpath_to_files}{table_name}_inserts.sql"
-    else:
-        return f"{outpath_to_files}/{table_name}_inserts.sql"
-
-
-def write_bash_wrapper(table_name, path_to_track_files, DBMS):
-    '''
-    write a shell script to execute the sql inserts created by this script
-    '''
-    db_name = path_to_track_files.split('/')[-2].split('_')[0]
-
-    with open(f"{path_to_track_files}/run.sh", 'w') as f:
-        f.write(f"""
-#/usr/bin/env bash 
-sudo {DBMS} -u root -p {db_name} < {table_name}.sql
-sudo {DBMS} -u root -p {db_name} < {table_name}_inserts.sql
-
-
-#Add respective hgFindSpec and trackDb entries
-sudo {DBMS} -u root -p {db_name} < trackDb_inserts.sql
-sudo {DBMS} -u root -p {db_name} < hgFindSpec_inserts.sql
-        """)
-
-
-def main(args):
-    '''
-    run functions
-    '''
-    get_file_from_url(args.u, args.p, args.o)
-    table_name = get_table_name_from_hgFindSpec(args.p)
-    table_creation_sql_path = create_table(args.p, table_name)
-    path_in_gbdb_to_file = args.o + '/' + args.u.split("/")[-1] 
-    inserts_sql_path = write_table_inserts(table_name, path_in_gbdb_to_file, args.p)
-
-    write_bash_wrapper(table_name, args.p, args.dbms)
-    return True
+    directory = os.path.basename(os.path.normpath(path_to_track_files))
+    if '_' not in directory:
+        raise ValueError(f"{path_to_track_files} is not a directory written by general_track.py (UCSC_files/<db>_<table>)")
+    return directory.split('_', 1)
 
 
 if __name__ == "__main__":
@@ -112,6 +34,9 @@ if __name__ == "__main__":
     parser.add_argument("-o", help="path to oragnsim Db in gbdb on host server")
     parser.add_argument("--dbms", help="DBMS - Database management system (mariadb on poitin, mysql on baileys)")
 
-
-    args = parser.parse_args()
-    main(args)
\ No newline at end of file
+    args, other_args = parser.parse_known_args()
+    db_name, table_name = get_db_and_table_name(args.p)
+    for flag, value in (("-u", args.u), ("-o", args.o), ("--dbms", args.dbms)):
+        if value:
+            other_args = [flag, value, *other_args]
+    track_update.main(track_update.parse_args(["bigbed", "--ask-password", "-t", table_name, "-d", db_name, *other_args]))
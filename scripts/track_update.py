@@ -0,0 +1,869 @@
+"""
+Create the SQL (and run.sh) required to add or update a track on GWIPS-viz from its UCSC counterpart
+
+Every kind of track goes through the same pipeline (download, insert generation, trackDb and hgFindSpec
+entries, run.sh and load_plan.json), set up for the kind of track by one of PROFILES:
+
+generic - a table and any tables named <table>*. The user can find the name of the table
+          @ https://hgdownload.soe.ucsc.edu/goldenPath/hg38/database/ for humans for example
+gencode - every table of a GENCODE release (wgEncodeGencode*V<version>*) plus the trackDb entries of its
+          composite and view tracks, and the supporting tables settings of the gene tracks
+bigbed - a track whose data is stored in a bigBed (or bigWig) file rather than available via .txt.gz (eg. MANE).
+         The file is fetched, checked and installed into gbdb (gbdb_files) and the table written here holds its path.
+         With --manifest many such tracks are registered at once, their files synced together
+
+Examples
+python scripts/track_update.py generic -t orfeomeMrna -d hg38 --dbms mariadb
+python scripts/track_update.py gencode -g 41 -d hg38 --dbms mariadb
+python scripts/track_update.py bigbed -t mane -d hg38 --dbms mariadb -u https://hgdownload.soe.ucsc.edu/gbdb/hg38/mane/mane.1.0.bb -o /gbdb/hg38/mane
+
+general_track.py, gencode.py and track_data_from_file.py run the generic, gencode and bigbed profiles with their
+original arguments
+"""
+
+import argparse
+import gzip
+import json
+import os
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+import build_manifest
+import download_manager
+import gbdb_files
+import gzip_io
+import instrument
+import loader
+import mirror_cache
+import table_diff
+import trackdb_index
+import ucsc_schema
+import verify
+
+# size of the write buffer used when writing insert files (1 MiB)
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# default rows per extended INSERT and the MariaDB default max_allowed_packet (16 MiB)
+DEFAULT_BATCH_ROWS = 1000
+DEFAULT_MAX_ALLOWED_PACKET = 16 * 1024 * 1024
+
+# inserts - write <table>_inserts.sql files and pipe them into the client
+# load-data - skip the insert files and bulk load each .txt.gz with LOAD DATA LOCAL INFILE
+# stream - skip the insert files and load the track now over a DB-API connection, streaming the rows of each .txt.gz
+#          into executemany (loader.stream_table). run.sh is written as for load-data to reload it later
+LOAD_MODES = ('inserts', 'load-data', 'stream')
+
+# schema - quote and escape each value by its column type in the .sql CREATE TABLE, keeping the data exact (ucsc_schema)
+# line - split, clean and join each row in turn (read_table_rows / write_insert_statements), quoting every value
+#        as a string with any " removed
+ENGINES = ('schema', 'line')
+
+# UCSC .txt.gz dumps are written by SELECT ... INTO OUTFILE so these clauses match them exactly
+# (tab separated, no enclosing quotes, backslash escapes and \N for NULL). CHARACTER SET binary
+# stops the server converting the bytes. Written for use inside a double quoted bash string
+LOAD_DATA_SQL = r"""LOAD DATA LOCAL INFILE '/dev/stdin' INTO TABLE \`${TABLE_NAME}\` CHARACTER SET binary FIELDS TERMINATED BY '\t' ENCLOSED BY '' ESCAPED BY '\\\\' LINES TERMINATED BY '\n'"""
+
+# see the module docstring
+PROFILES = ('generic', 'gencode', 'bigbed')
+
+# trackDb and hgFindSpec are read and their insert files written as latin-1 so their bytes reach the server unchanged
+ENTRY_ENCODING = 'ISO-8859-1'
+
+# table of a bigbed track, holding the path to its file in gbdb
+FILE_TABLE_SQL = """
+
+
+DROP TABLE IF EXISTS `{table_name}`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `{table_name}` (
+  `filename` varchar(255)
+) ENGINE=MyISAM DEFAULT CHARSET=latin1;
+        
+        
+        """
+
+
+def get_profile(profile, name):
+    '''
+    the settings of one track of the given profile (one of PROFILES) as a dict
+
+    name - the table name, or the release for gencode (eg. 41 or M25)
+    label - name used in messages, directory - the track is written to UCSC_files/<db>_<directory>
+    patterns - the files of the track in the goldenPath database directory
+    trackDb_tables - tables whose trackDb entries are wanted besides those of the downloaded tables
+    trackDb_settings - {table: settings} appended to the settings of those trackDb entries
+    is_search - takes an hgFindSpec searchName and returns True for the searches of the track
+    '''
+    if profile == 'gencode':
+        gene_table_settings = f"""wgEncodeGencodeAttrs wgEncodeGencodeAttrsV{name}
+ wgEncodeGencodeGeneSource wgEncodeGencodeGeneSourceV{name}
+ wgEncodeGencodeTranscriptSource wgEncodeGencodeTranscriptSourceV{name}
+ wgEncodeGencodePdb wgEncodeGencodePdbV{name}
+ wgEncodeGencodePubMed wgEncodeGencodePubMedV{name}
+ wgEncodeGencodeRefSeq wgEncodeGencodeRefSeqV{name}
+ wgEncodeGencodeTag wgEncodeGencodeTagV{name}
+ wgEncodeGencodeUniProt wgEncodeGencodeUniProtV{name}
+ wgEncodeGencodeTranscriptSupport wgEncodeGencodeTranscriptSupportV{name}
+                        """
+        # the gene tracks also need to know where to find their supporting tables
+        gene_tables = [f"wgEncodeGencodeBasicV{name}", f"wgEncodeGencodeCompV{name}", f"wgEncodeGencodePseudoGeneV{name}", f"wgEncodeGencodePolyAV{name}"]
+        return {
+            "profile": profile,
+            "name": name,
+            "label": f"Gencode {name}",
+            "directory": f"gencodeV{name}",
+            "patterns": [f"wgEncodeGencode*V{name}*"],
+            "trackDb_tables": {f"wgEncodeGencodeV{name}", f"wgEncodeGencodeV{name}ViewGenes", f"wgEncodeGencodeV{name}View2Way", f"wgEncodeGencodeV{name}ViewPolya"},
+            "trackDb_settings": {table: gene_table_settings for table in gene_tables},
+            "is_search": lambda search_name: 'wgEncodeGencode' in search_name and f"V{name}" in search_name,
+        }
+
+    return {
+        "profile": profile,
+        "name": name,
+        "label": name,
+        "directory": name,
+        # the table of a bigbed track is written by write_file_table, not downloaded
+        "patterns": [] if profile == 'bigbed' else [f"{name}*"],
+        "trackDb_tables": {name},
+        "trackDb_settings": {},
+        "is_search": lambda search_name: name in search_name,
+    }
+
+
+def get_track_path(profile, organism_db):
+    '''
+    directory the files of the track are written to
+    '''
+    return f"./UCSC_files/{organism_db}_{profile['directory']}"
+
+
+def get_track_files_from_UCSC(profile, organism_db, base_path=download_manager.UCSC_BASE_PATH, workers=download_manager.DEFAULT_WORKERS):
+    '''
+    download files from UCSC for the desired track
+
+    profile - from get_profile
+    Organism_db - string (eg. hg38)
+    base_path is left variable in case it changes over time.
+    workers - number of files downloaded at once
+    '''
+    url = f"{base_path}/{organism_db}/database"
+    outfile_path = get_track_path(profile, organism_db)
+    if not profile["patterns"]: # nothing to fetch (bigbed), skip the listing and md5sum.txt
+        os.makedirs(outfile_path, exist_ok=True)
+        return outfile_path
+    download_manager.download_matching_files(url, profile["patterns"], outfile_path, workers, mirror_cache.fetcher(organism_db, "database"))
+    return outfile_path
+
+
+def get_organism_files(organism_db, base_path=download_manager.UCSC_BASE_PATH, workers=download_manager.DEFAULT_WORKERS):
+    '''
+    hgFindSpec and trackDb are also required to set the desired annotation track up on GWIPS-viz
+
+    Organism_db - string (eg. hg38)
+    base_path is left variable in case it changes over time.
+    workers - number of files downloaded at once
+    '''
+    url = f"{base_path}/{organism_db}/database"
+    outfile_path = f"./UCSC_files/{organism_db}"
+    download_manager.download_matching_files(url, ["trackDb*", "hgFindSpec*"], outfile_path, workers, mirror_cache.fetcher(organism_db, "database"))
+    return outfile_path
+
+
+def get_txt_filenames_as_list(path_to_files):
+    '''
+    return all txt.gz files names from the provided directory 
+    '''
+    txt_file_list = [] 
+
+    for file in os.listdir(path_to_files):
+        if file.endswith('txt.gz'):
+            txt_file_list.append(file)
+    return txt_file_list
+
+
+def read_table_rows(path_to_txt_gz):
+    '''
+    yield the rows of a UCSC tab delimited .txt.gz file one at a time as lists of column values
+
+    The file is read line by line so memory use does not grow with the size of the table
+    '''
+    with gzip_io.open_gz(path_to_txt_gz, 'rt') as f:
+        for line in f:
+            yield line.rstrip('\n').split('\t')
+
+
+def format_row_values(row):
+    '''
+    return the bracketed VALUES tuple for one row of a UCSC table
+    '''
+    row = [i.replace('"', '') for i in row]
+
+    entries = '","'.join(row)
+    return f'("{entries}")'
+
+
+def rows_to_insert_statements(table_name, rows):
+    '''
+    yield one INSERT statement for each row produced by read_table_rows
+    '''
+    for row in rows:
+        yield f'INSERT INTO {table_name} VALUES {format_row_values(row)};\n'
+
+
+def rows_to_extended_insert_statements(table_name, rows, batch_rows=DEFAULT_BATCH_ROWS, max_allowed_packet=DEFAULT_MAX_ALLOWED_PACKET):
+    '''
+    yield multi-row INSERT statements (VALUES (...),(...),...) for the rows produced by read_table_rows
+
+    A statement is closed once it holds batch_rows rows or adding the next row would take it past
+    max_allowed_packet bytes. A single row larger than max_allowed_packet is still written on its own
+    '''
+    prefix = f'INSERT INTO {table_name} VALUES '
+    prefix_size = len(prefix.encode())
+    batch = []
+    batch_size = prefix_size
+    for row in rows:
+        values = format_row_values(row)
+        values_size = len(values.encode()) + 1 # allow for the separating comma or closing semicolon
+        if batch and (len(batch) >= batch_rows or batch_size + values_size + 1 > max_allowed_packet):
+            yield prefix + ','.join(batch) + ';\n'
+            batch = []
+            batch_size = prefix_size
+        batch.append(values)
+        batch_size += values_size
+    if batch:
+        yield prefix + ','.join(batch) + ';\n'
+
+
+def write_insert_statements(outfile, table_name, rows, batch_rows=1, max_allowed_packet=DEFAULT_MAX_ALLOWED_PACKET):
+    '''
+    write insert statements for rows to the open outfile and return the number of rows written
+
+    batch_rows of 1 writes one INSERT per row. Anything larger writes extended inserts wrapped in
+    LOCK TABLES and DISABLE KEYS so the indexes are rebuilt once at the end rather than row by row
+    '''
+    row_count = 0
+
+    def counted(rows):
+        nonlocal row_count
+        for row in rows:
+            row_count += 1
+            yield row
+
+    if batch_rows <= 1:
+        outfile.writelines(rows_to_insert_statements(table_name, counted(rows)))
+        return row_count
+
+    outfile.write(f'LOCK TABLES `{table_name}` WRITE;\n')
+    outfile.write(f'ALTER TABLE `{table_name}` DISABLE KEYS;\n')
+    outfile.writelines(rows_to_extended_insert_statements(table_name, counted(rows), batch_rows, max_allowed_packet))
+    outfile.write(f'ALTER TABLE `{table_name}` ENABLE KEYS;\n')
+    outfile.write('UNLOCK TABLES;\n')
+    return row_count
+
+
+def write_table_inserts(path_to_track_files, table_name, batch_rows=1, max_allowed_packet=DEFAULT_MAX_ALLOWED_PACKET, engine='schema', compress=False, checksum=None):
+    '''
+    write <table>_inserts.sql (<table>_inserts.sql.gz if compress) for one table with the chosen engine (see ENGINES)
+    and return the number of rows written
+
+    The file is written under a temporary name and only renamed into place once it is complete
+    checksum - the schema engine adds the rows to it on the way (see verify.new_table_checksum)
+    '''
+    path_to_txt_gz = f"{path_to_track_files}/{table_name}.txt.gz"
+    path_to_inserts = f"{path_to_track_files}/{table_name}_inserts{gzip_io.sql_suffix(compress)}"
+
+    if engine == 'schema':
+        kinds = ucsc_schema.get_column_kinds(f"{path_to_track_files}/{table_name}.sql")
+        with build_manifest.atomic_write(path_to_inserts, 'wb', buffering=WRITE_BUFFER_SIZE) as f, gzip_io.open_writer(f, 'wb', compress) as outfile:
+            outfile.write(ucsc_schema.HEADER)
+            return ucsc_schema.write_table_insert_statements(outfile, path_to_txt_gz, table_name, kinds, batch_rows, max_allowed_packet, checksum)
+
+    rows = read_table_rows(path_to_txt_gz)
+    with build_manifest.atomic_write(path_to_inserts, 'wb', buffering=WRITE_BUFFER_SIZE) as f, gzip_io.open_writer(f, 'w', compress) as outfile:
+        return write_insert_statements(outfile, table_name, rows, batch_rows, max_allowed_packet)
+
+
+def tables_to_sql_statements(path_to_track_files, batch_rows=1, max_allowed_packet=DEFAULT_MAX_ALLOWED_PACKET, engine='schema', compress=False):
+    '''
+    Only used with --load-mode inserts. --load-mode load-data loads the .txt.gz directly with LOAD DATA LOCAL
+
+    takes in path to dir that has .txt.gz and .sql files describing the data pertaining to each table
+
+    Parse this data and produce an sql file full of insert statements to populate the table on GWIPS
+    The .txt.gz is streamed through a single buffered output handle and the rate achieved is reported
+    A table is skipped only if build_manifest shows its insert file was built from the same .txt.gz and .sql with the same settings
+    The schema engine records the checksum of the rows for verify.py as it goes, unless it already was
+
+    batch_rows - rows per INSERT statement, values above 1 write extended inserts
+    max_allowed_packet - upper bound in bytes on the size of each statement (match the servers setting)
+    engine - one of ENGINES, see write_table_inserts
+    compress - write gzipped <table>_inserts.sql.gz files instead
+    '''
+
+    for file in get_txt_filenames_as_list(path_to_track_files):
+        table_name = file[:-len('.txt.gz')]
+
+        # the .sql decides how the schema engine writes each column, so a changed column type rebuilds the inserts
+        settings = {"batch_rows": batch_rows, "max_allowed_packet": max_allowed_packet, "engine": engine,
+                    "schema": build_manifest.file_sha256(f"{path_to_track_files}/{table_name}.sql")}
+        output_name = f"{table_name}_inserts{gzip_io.sql_suffix(compress)}"
+        if build_manifest.is_output_current(path_to_track_files, output_name, f"{path_to_track_files}/{file}", settings):
+            print(f"Insert statements already created: {table_name}")
+            continue
+        else:
+            print(f"Writing statements for: {file}")
+
+        checksum = None
+        if engine == 'schema' and build_manifest.get_checksum(path_to_track_files, table_name, f"{path_to_track_files}/{file}") is None:
+            checksum = verify.new_table_checksum(path_to_track_files, table_name)
+        with instrument.stage("insert generation", table=table_name) as record:
+            record["rows"] = write_table_inserts(path_to_track_files, table_name, batch_rows, max_allowed_packet, engine, compress, checksum)
+            build_manifest.record_output(path_to_track_files, output_name, f"{path_to_track_files}/{file}", settings)
+            if checksum is not None:
+                verify.save_table_checksum(path_to_track_files, table_name, checksum)
+        print(f"Wrote {record['rows']} rows for {table_name} in {record['wall_seconds']:.2f}s ({record['rows'] / max(record['wall_seconds'], 1e-9):.0f} rows/sec)")
+
+
+def tables_to_delta_sql_statements(path_to_track_files, batch_rows=1, max_allowed_packet=DEFAULT_MAX_ALLOWED_PACKET, engine='schema', compress=False, load_mode='inserts'):
+    '''
+    Diff mode - compare each table with the snapshot of its last load (see table_diff) and write only what changed
+
+    unchanged tables get no SQL at all, changed tables get a <table>_delta.sql of DELETEs and INSERTs and
+    tables without a snapshot get a full <table>_inserts.sql (loaded from their .txt.gz instead in the other
+    load modes). The checksum of the rows for verify.py is recorded while the digest is taken, unless it already
+    was. Returns {table_name: action} for write_bash_wrapper
+    '''
+    table_actions = {}
+    for file in get_txt_filenames_as_list(path_to_track_files):
+        table_name = file[:-len('.txt.gz')]
+        checksum = None
+        if build_manifest.get_checksum(path_to_track_files, table_name, f"{path_to_track_files}/{file}") is None:
+            checksum = verify.new_table_checksum(path_to_track_files, table_name)
+        action, digest = table_diff.plan_table_update(path_to_track_files, table_name, checksum)
+        if checksum is not None:
+            verify.save_table_checksum(path_to_track_files, table_name, checksum)
+        table_actions[table_name] = action
+        print(f"{table_name}: {action}")
+
+        if action == table_diff.UNCHANGED:
+            continue
+        if action == table_diff.FULL and load_mode != 'inserts':
+            table_diff.stage_snapshot(path_to_track_files, table_name, digest)
+            continue
+
+        with instrument.stage("insert generation", table=table_name) as record:
+            if action == table_diff.FULL:
+                record["rows"] = write_table_inserts(path_to_track_files, table_name, batch_rows, max_allowed_packet, engine, compress)
+            elif action == table_diff.DELTA:
+                columns = ucsc_schema.parse_create_table(f"{path_to_track_files}/{table_name}.sql")
+                column_names = [name for name, _ in columns]
+                path_to_snapshot, _ = table_diff.get_snapshot_paths(path_to_track_files, table_name)
+                new_counts = table_diff.count_row_hashes(f"{path_to_track_files}/{file}")
+                deleted_rows = table_diff.iter_deleted_rows(path_to_snapshot, new_counts)
+                inserted_rows = table_diff.iter_inserted_rows(f"{path_to_track_files}/{file}", new_counts)
+                deleted = 0
+                if engine == 'schema':
+                    kinds = [ucsc_schema.column_kind(column_type) for _, column_type in columns]
+                    with build_manifest.atomic_write(f"{path_to_track_files}/{table_name}_delta.sql", 'wb', buffering=WRITE_BUFFER_SIZE) as outfile:
+                        outfile.write(ucsc_schema.HEADER)
+                        for row in deleted_rows:
+                            outfile.write(f'DELETE FROM `{table_name}` WHERE '.encode() + ucsc_schema.row_to_condition(ucsc_schema.split_fields(row), column_names, kinds) + b' LIMIT 1;\n')
+                            deleted += 1
+                        rows = (ucsc_schema.split_fields(row) for row in inserted_rows)
+                        inserted = ucsc_schema.write_insert_statements(outfile, rows, table_name, kinds, batch_rows, max_allowed_packet)
+                else:
+                    with build_manifest.atomic_write(f"{path_to_track_files}/{table_name}_delta.sql", buffering=WRITE_BUFFER_SIZE) as outfile:
+                        for row in deleted_rows:
+                            outfile.write(table_diff.delete_statement(table_name, column_names, row.decode().split('\t')))
+                            deleted += 1
+                        rows = (row.decode().split('\t') for row in inserted_rows)
+                        inserted = write_insert_statements(outfile, table_name, rows, batch_rows, max_allowed_packet)
+                record["rows"] = deleted + inserted
+                print(f"{table_name}: {deleted} rows deleted, {inserted} rows inserted")
+            table_diff.stage_snapshot(path_to_track_files, table_name, digest)
+        print(f"Wrote {record['rows']} rows for {table_name} in {record['wall_seconds']:.2f}s ({record['rows'] / max(record['wall_seconds'], 1e-9):.0f} rows/sec)")
+    return table_actions
+
+
+def trackDb_entry_to_values(values):
+    '''
+    the "," joined values of the INSERT statement for one trackDb entry (from trackdb_index.iter_entries)
+
+    escaped newlines (between the settings) become a newline and a space and " becomes '
+    '''
+    values = list(values)
+    # some entries have missing columns. Add these as blank in the seconds last position to make up numbers
+    for i in range(21 - len(values)):
+        values.insert(-2, '')
+
+    return '","'.join(value.replace('\\\n', '\n ').replace('"', "'") for value in values)
+
+
+def get_trackDb_entries_as_insert_statements(path_to_track_files, path_to_trackDb, profile, verbose=False):
+    '''
+    Search trackDb.txt file for entries pertaining to each table of the track and those in profile["trackDb_tables"]
+    Write SQL insert statements for updating the track in GWIPS
+
+    Entries are read one at a time through the per organism index in trackdb_index rather than re-parsing the
+    whole file, and matched against a set of the wanted table names
+    '''
+    track_files = get_txt_filenames_as_list(path_to_track_files)
+    wanted_tables = {file[:-len('.txt.gz')] for file in track_files}
+    wanted_tables.update(profile["trackDb_tables"])
+
+    with open(f"{path_to_track_files}/trackDb_inserts.sql", 'w', encoding=ENTRY_ENCODING) as outfile:
+        for values in trackdb_index.iter_entries(path_to_trackDb, wanted_tables.__contains__, encoding=ENTRY_ENCODING):
+            table = values[0]
+            if verbose:
+                print(f"trackDb entry found for: {table}")
+
+            trackDb_entry = trackDb_entry_to_values(values) + profile["trackDb_settings"].get(table, '')
+            # replace any entry already in the database rather than failing on its key
+            outfile.write(f'DELETE FROM trackDb WHERE tableName = "{table}";\n')
+            outfile.write(f'INSERT INTO trackDb VALUES ("{trackDb_entry}");\n')
+
+
+def get_hgFindSpec_entries_as_insert_statements(path_to_track_files, path_to_hgFindSpec, profile):
+    '''
+    get all entries from the hgFindSpec txt.gz file that are searches of the track (profile["is_search"]) and
+    create insert statements (looked up one at a time through the per organism index in trackdb_index)
+    '''
+    with open(f"{path_to_track_files}/hgFindSpec_inserts.sql", 'w', encoding=ENTRY_ENCODING) as outfile:
+        for values in trackdb_index.iter_entries(path_to_hgFindSpec, profile["is_search"], encoding=ENTRY_ENCODING):
+            hgFindSpec_entry = '","'.join(values).removesuffix('\\\n').replace('\\\n', '\n ')
+            outfile.write(f'DELETE FROM hgFindSpec WHERE searchName = "{values[0]}";\n')
+            outfile.write(f'INSERT INTO hgFindSpec VALUES ("{hgFindSpec_entry}");\n')
+
+    return True
+
+
+def write_file_table(path_to_track_files, table_name, path_in_gbdb_to_file):
+    '''
+    write the .sql and .txt.gz of a bigbed tracks table, one row holding the path to its file in gbdb
+
+    They are laid out like a table downloaded from UCSC so the insert engines, diff mode and load modes all apply
+    '''
+    os.makedirs(path_to_track_files, exist_ok=True)
+    with open(f"{path_to_track_files}/{table_name}.sql", 'w') as f:
+        f.write(FILE_TABLE_SQL.format(table_name=table_name))
+    with build_manifest.atomic_write(f"{path_to_track_files}/{table_name}.txt.gz", 'wb') as f, gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as outfile:
+        outfile.write(path_in_gbdb_to_file.encode(ENTRY_ENCODING) + b'\n')
+
+
+def write_deferred_index_files(path_to_track_files, table_name):
+    '''
+    --defer-indexes: split the .sql of a table into <table>_create.sql, creating it without its secondary indexes
+    (see ucsc_schema.split_secondary_indexes), and <table>_indexes.sql adding them all in one ALTER TABLE once
+    the rows are in. Building an index from loaded rows in one sort is much faster than maintaining it row by row.
+    Returns the number of indexes deferred (no _indexes.sql is written if there are none)
+    '''
+    create_table, indexes = ucsc_schema.split_secondary_indexes(f"{path_to_track_files}/{table_name}.sql")
+    with open(f"{path_to_track_files}/{table_name}_create.sql", 'w', encoding='ISO-8859-1') as f:
+        f.write(create_table)
+    path_to_indexes = f"{path_to_track_files}/{table_name}_indexes.sql"
+    if os.path.exists(path_to_indexes):
+        os.remove(path_to_indexes)
+    if indexes:
+        with open(path_to_indexes, 'w', encoding='ISO-8859-1') as f:
+            f.write(f"ALTER TABLE `{table_name}`\n  " + ",\n  ".join(f"ADD {index}" for index in indexes) + ";\n")
+    return len(indexes)
+
+
+def write_bash_wrapper(path_to_track_files, profile, DBMS, db_name, load_mode='inserts', table_actions=None, compress=False, ask_password=False, defer_indexes=False):
+    '''
+    Write a bash script to run the sql table creation and inserts 
+
+    DBMS - Database management system (mariadb on poitin, mysql on baileys)
+    load_mode - one of LOAD_MODES. load-data (and stream) pipe each .txt.gz straight into LOAD DATA LOCAL INFILE
+    table_actions - from tables_to_delta_sql_statements in diff mode. Each table is then skipped, patched with
+    its _delta.sql or fully reloaded, and the snapshots promoted once every table has loaded, been indexed and
+    verified
+    compress - the insert files were written gzipped (<table>_inserts.sql.gz)
+    ask_password - run the client with -p so it asks for the root password
+    defer_indexes - create the tables with their <table>_create.sql and add their indexes (<table>_indexes.sql,
+    see write_deferred_index_files) once all of them have loaded, every table at once unless ask_password
+
+    Unless every table comes from the SQL of the line engine, the tables are checked against their .txt.gz once
+    loaded (with verify.sql from verify.write_checks) and the entries only added if they all match
+    '''
+    client = f"sudo {DBMS} -u root{' -p' if ask_password else ''} {db_name}"
+    if load_mode in ('load-data', 'stream'):
+        populate = f'$UNZIP "${{file%.sql}}.txt.gz" | {client} --local-infile=1 -e "{LOAD_DATA_SQL};"'
+    elif compress:
+        populate = f'$UNZIP ${{TABLE_NAME}}_inserts.sql.gz | {client}'
+    else:
+        populate = f'{client} < ${{TABLE_NAME}}_inserts.sql'
+    create = '"${file%.sql}_create.sql"' if defer_indexes else '$file'
+    table_path = f"{os.getcwd()}/{path_to_track_files}"
+
+    if table_actions is None:
+        tables_section = f'''for file in {os.getcwd()}/{path_to_track_files}/*{profile['name']}.sql; do 
+    {client} < {create} # set up tracks table in the database
+
+    # Get the Table name from file path 
+    pathArr=(${{file//// }})
+    SQL_NAME=${{pathArr[-1]}}
+    SQL_NAME_ARR=(${{SQL_NAME//./ }})
+    TABLE_NAME=${{SQL_NAME_ARR[0]}}
+    
+    echo "inserting ${db_name}"
+    # populate the created table with data from .txt file 
+    {populate}
+    echo "Done"
+done
+'''
+    else:
+        tables_section = 'failed=()\n'
+        promotions = ''
+        for table_name, action in table_actions.items():
+            if action == table_diff.UNCHANGED:
+                tables_section += f'echo "{table_name} unchanged since the last load, skipped"\n'
+                continue
+            tables_section += f'\n# {table_name}: {action}\n'
+            if action == table_diff.DELTA:
+                tables_section += f'{client} < "{table_path}/{table_name}_delta.sql" || failed+=({table_name})\n'
+            else:
+                tables_section += f'file="{table_path}/{table_name}.sql"\nTABLE_NAME={table_name}\n'
+                tables_section += f'{client} < {create} && {populate} || failed+=({table_name})\n'
+            promotions += table_diff.promote_snapshot_commands(table_path, table_name)
+        tables_section += '[ ${#failed[@]} -eq 0 ] || { echo "failed to load ${failed[*]}, trackDb and hgFindSpec not updated"; exit 1; }\n'
+
+    indexed = [table["name"] for table in loader.read_load_plan(path_to_track_files)["tables"] if table.get("indexes")] if defer_indexes else []
+    if indexed:
+        failed = '{ echo "adding indexes failed, trackDb and hgFindSpec not updated"; exit 1; }'
+        if ask_password: # one after the other, or every client would ask for the password at the same time
+            tables_section += '\n# add the indexes of the loaded tables\n'
+            for table_name in indexed:
+                tables_section += f'echo "indexing {table_name}"\n{client} < "{table_path}/{table_name}_indexes.sql" || {failed}\n'
+        else:
+            tables_section += '\n# add the indexes of the loaded tables, all tables at once\npids=()\n'
+            for table_name in indexed:
+                tables_section += f'echo "indexing {table_name}"\n{client} < "{table_path}/{table_name}_indexes.sql" & pids+=($!)\n'
+            tables_section += f'for pid in "${{pids[@]}}"; do wait $pid || {failed}; done\n'
+
+    if verify.checked_tables(path_to_track_files):
+        tables_section += f'''
+# check the row count and checksum of every table against its .txt.gz (verify.py), any line shown differs
+echo "verifying tables"
+{client} -N < "{table_path}/{verify.CHECK_SQL_NAME}" | diff "{table_path}/{verify.EXPECTED_NAME}" - || {{ echo "tables differ from the UCSC files, trackDb and hgFindSpec not updated"; exit 1; }}
+'''
+
+    if table_actions is not None and promotions:
+        # only once every table has loaded, has its indexes and matches its .txt.gz, so a failed run is diffed
+        # against what the database really holds next time
+        tables_section += f'''
+# the tables now hold the new data, keep it as the snapshots to diff the next release against
+{promotions}'''
+
+    with open(f"{path_to_track_files}/run.sh", 'w') as sh:
+        sh.write(f"# This BASH Script adds {profile['label']} to GWIPS-viz\n")
+        sh.write(f'''
+#/usr/bin/env bash 
+
+# decompress with pigz when it is installed
+UNZIP="gzip -dc"
+command -v pigz > /dev/null && UNZIP="pigz -dc"
+# a pipe fails if either side does, so a truncated .gz is not taken for a complete load
+set -o pipefail
+
+{tables_section}
+#Add respective entries to trackDb and hgFindSpec
+# first on empty temporary copies of both tables (they hide the real ones from that session), so a statement the
+# server rejects stops here before any entry is replaced. The tables are MyISAM and cannot roll back
+(echo "CREATE TEMPORARY TABLE trackDb LIKE trackDb; CREATE TEMPORARY TABLE hgFindSpec LIKE hgFindSpec;"; cat trackDb_inserts.sql hgFindSpec_inserts.sql) | {client} || {{ echo "the trackDb/hgFindSpec entries were rejected, no entries changed"; exit 1; }}
+# then for real in one session holding both tables, so the browser never sees some of the entries replaced and not
+# others. Should it still fail part way, run this script again: every entry is deleted before it is inserted
+(echo "SET autocommit=0; LOCK TABLES trackDb WRITE, hgFindSpec WRITE;"; cat trackDb_inserts.sql hgFindSpec_inserts.sql; echo "COMMIT; UNLOCK TABLES;") | {client} || {{ echo "replacing the trackDb/hgFindSpec entries failed part way, run again to finish"; exit 1; }}
+
+        ''')
+
+def read_manifest(path_to_manifest, default_db=None):
+    '''
+    return the (organism_db, name) pairs listed in a batch manifest, in file order
+
+    One track per line, either "<name>" (uses default_db) or "<db> <name>", where name is a table or a GENCODE
+    release depending on the profile. Blank lines and # comments are ignored
+    '''
+    tracks = []
+    with open(path_to_manifest, 'r') as f:
+        for line in f:
+            fields = line.split('#')[0].split()
+            if not fields:
+                continue
+            if len(fields) == 1:
+                if default_db is None:
+                    raise ValueError(f"{path_to_manifest}: no database given for {fields[0]} (add it to the line or pass -d)")
+                fields = [default_db, fields[0]]
+            tracks.append((fields[0], fields[1]))
+    return tracks
+
+
+def process_track(name, organism_db, args, path_in_gbdb=None):
+    '''
+    download one track of the args.profile profile and write its insert statements, trackDb/hgFindSpec entries and run.sh
+
+    Expects get_organism_files to have been run for organism_db already, and for bigbed tracks the file to have
+    been installed at path_in_gbdb (see register_file_tracks). Returns the path to the track files
+    '''
+    gzip_io.set_decompressor(args.decompressor)
+    profile = get_profile(args.profile, name)
+    with instrument.stage("download track files", track=name):
+        path_to_track_files = get_track_files_from_UCSC(profile, organism_db, args.base_path, args.workers)
+        if args.profile == 'bigbed':
+            write_file_table(path_to_track_files, name, path_in_gbdb)
+    path_to_organism_files = f"./UCSC_files/{organism_db}"
+    table_actions = None
+    if args.diff:
+        table_actions = tables_to_delta_sql_statements(path_to_track_files, args.batch_rows, args.max_allowed_packet, args.engine, args.compress_inserts, args.load_mode)
+    elif args.load_mode == 'inserts':
+        tables_to_sql_statements(path_to_track_files, args.batch_rows, args.max_allowed_packet, args.engine, args.compress_inserts)
+    with instrument.stage("trackDb matching", track=name):
+        get_trackDb_entries_as_insert_statements(path_to_track_files, path_to_organism_files+"/trackDb.txt.gz", profile, args.verbose)
+    with instrument.stage("hgFindSpec filtering", track=name):
+        get_hgFindSpec_entries_as_insert_statements(path_to_track_files, path_to_organism_files+"/hgFindSpec.txt.gz", profile)
+    if args.defer_indexes:
+        with instrument.stage("index deferral", track=name):
+            for file in get_txt_filenames_as_list(path_to_track_files):
+                write_deferred_index_files(path_to_track_files, file[:-len('.txt.gz')])
+    loader.write_load_plan(path_to_track_files, organism_db, f"*{name}.sql", args.load_mode, table_actions, args.compress_inserts, args.defer_indexes, args.engine)
+    with instrument.stage("source checksums", track=name) as record:
+        table_names = verify.checked_tables(path_to_track_files)
+        if args.load_mode != 'stream': # the loader records them as it streams the rows (see load_tracks_now)
+            record["rows"] = verify.record_source_checksums(path_to_track_files, table_names)
+        verify.write_checks(path_to_track_files, table_names)
+    with instrument.stage("wrapper writing", track=name):
+        write_bash_wrapper(path_to_track_files, profile, args.dbms, organism_db, args.load_mode, table_actions, args.compress_inserts, args.ask_password, args.defer_indexes)
+    return path_to_track_files
+
+
+def read_file_manifest(path_to_manifest, default_db=None):
+    '''
+    return the (organism_db, name, url, gbdb directory) of the bigbed tracks listed in a manifest, in file order
+
+    One track per line as "[<db>] <table> <url> [<gbdb directory>]". The database defaults to default_db and the gbdb
+    directory to the one the file is in on UCSC (see gbdb_files.get_gbdb_dir). Blank lines and # comments are ignored
+    '''
+    tracks = []
+    with open(path_to_manifest, 'r') as f:
+        for line in f:
+            fields = line.split('#')[0].split()
+            if not fields:
+                continue
+            urls = [i for i, field in enumerate(fields) if '://' in field]
+            if len(urls) != 1 or urls[0] not in (1, 2) or len(fields) > urls[0] + 2:
+                raise ValueError(f"{path_to_manifest}: expected [<db>] <table> <url> [<gbdb directory>], got: {line.strip()}")
+            names, url, gbdb_dir = fields[:urls[0]], fields[urls[0]], fields[urls[0] + 1:]
+            if len(names) == 1:
+                if default_db is None:
+                    raise ValueError(f"{path_to_manifest}: no database given for {names[0]} (add it to the line or pass -d)")
+                names = [default_db, names[0]]
+            tracks.append((names[0], names[1], url, gbdb_dir[0] if gbdb_dir else None))
+    return tracks
+
+
+def register_file_tracks(args):
+    '''
+    bigbed profile: register the track given by -t/-u/-o, or every track of args.manifest
+
+    trackDb and hgFindSpec are downloaded and indexed once per database, then the files of all the tracks are
+    fetched, checked and installed into gbdb together, args.workers files at a time (gbdb_files.sync_files). The
+    filename table, trackDb/hgFindSpec entries, run.sh and load_plan.json of every track are then written in one
+    pass, with the files of each track recorded in its gbdb_files.json. Returns the paths to the track files
+    '''
+    if args.manifest:
+        tracks = read_file_manifest(args.manifest, args.d)
+    else:
+        tracks = [(args.d, args.name, args.u, args.o)]
+    tracks = [(organism_db, name, download_manager.to_https(url), gbdb_dir) for organism_db, name, url, gbdb_dir in tracks]
+    tracks = [(organism_db, name, url, gbdb_dir or gbdb_files.get_gbdb_dir(url, args.gbdb_root)) for organism_db, name, url, gbdb_dir in tracks]
+
+    for organism_db in dict.fromkeys(db for db, _, _, _ in tracks):
+        with instrument.stage("download organism files", database=organism_db):
+            path_to_organism_files = get_organism_files(organism_db, args.base_path, args.workers)
+        with instrument.stage("trackDb indexing", database=organism_db):
+            trackdb_index.load_index(path_to_organism_files+"/trackDb.txt.gz")
+            trackdb_index.load_index(path_to_organism_files+"/hgFindSpec.txt.gz")
+
+    track_paths = [get_track_path(get_profile('bigbed', name), organism_db) for organism_db, name, _, _ in tracks]
+    with instrument.stage("gbdb sync", tracks=len(tracks)) as record:
+        synced = gbdb_files.sync_files([(organism_db, name, url, f"{path_to_track_files}/gbdb", gbdb_dir) for (organism_db, name, url, gbdb_dir), path_to_track_files in zip(tracks, track_paths)], args.workers)
+        record["rows"] = sum(len(files) for files in synced.values())
+
+    for (organism_db, name, url, gbdb_dir), path_to_track_files in zip(tracks, track_paths):
+        data_file = urllib.parse.unquote(url.rsplit('/', 1)[1])
+        process_track(name, organism_db, args, f"{gbdb_dir}/{data_file}")
+        with open(f"{path_to_track_files}/{gbdb_files.RECORD_NAME}", 'w') as f:
+            json.dump(synced[(organism_db, name)], f, indent=1)
+
+    if args.manifest:
+        manifest_name = os.path.splitext(os.path.basename(args.manifest))[0]
+        path_to_script = f"./UCSC_files/{manifest_name}_run.sh"
+        write_batch_bash_wrapper(path_to_script, [(organism_db, name) for organism_db, name, _, _ in tracks], track_paths)
+        print(f"Loader for {len(tracks)} tracks written to: {path_to_script}")
+    return track_paths
+
+
+def process_track_in_worker(name, organism_db, args):
+    '''
+    process_track in a pool worker. Returns its path and the stages it recorded, for the parent to report
+    '''
+    instrument.collect() # a forked worker starts with a copy of the parents records
+    instrument.configure(path_to_profile_dir=os.path.abspath(args.profile_dir) if args.profile_dir else None)
+    mirror_cache.configure_from_args(args)
+    path_to_track_files = process_track(name, organism_db, args)
+    return path_to_track_files, instrument.collect()
+
+
+def write_batch_bash_wrapper(path_to_script, tracks, track_paths):
+    '''
+    Write one bash script that runs the run.sh of every track in manifest order, stopping at the first failure
+    '''
+    with open(path_to_script, 'w') as sh:
+        sh.write("#!/usr/bin/env bash\n")
+        sh.write(f"# This BASH Script adds {len(tracks)} tracks to GWIPS-viz\n")
+        sh.write("set -e\n\n")
+        for (organism_db, name), path_to_track_files in zip(tracks, track_paths):
+            sh.write(f'echo "Adding {name} to {organism_db}"\n')
+            sh.write(f'(cd "{os.path.abspath(path_to_track_files)}" && bash run.sh)\n')
+
+
+def run_batch(args):
+    '''
+    process every track in args.manifest
+
+    trackDb and hgFindSpec are downloaded and indexed once per database, then the tracks are processed
+    args.jobs at a time in a process pool. A single combined loader script is written next to UCSC_files.
+    Returns the paths to the track files, in manifest order
+    '''
+    tracks = read_manifest(args.manifest, args.d)
+
+    for organism_db in dict.fromkeys(db for db, _ in tracks):
+        with instrument.stage("download organism files", database=organism_db):
+            path_to_organism_files = get_organism_files(organism_db, args.base_path, args.workers)
+        # build the indexes here so the worker processes only ever read them
+        with instrument.stage("trackDb indexing", database=organism_db):
+            trackdb_index.load_index(path_to_organism_files+"/trackDb.txt.gz")
+            trackdb_index.load_index(path_to_organism_files+"/hgFindSpec.txt.gz")
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(process_track_in_worker, name, organism_db, args) for organism_db, name in tracks]
+        track_paths = []
+        for future in futures:
+            path_to_track_files, stage_records = future.result()
+            track_paths.append(path_to_track_files)
+            instrument.add(stage_records)
+
+    manifest_name = os.path.splitext(os.path.basename(args.manifest))[0]
+    path_to_script = f"./UCSC_files/{manifest_name}_run.sh"
+    write_batch_bash_wrapper(path_to_script, tracks, track_paths)
+    print(f"Loader for {len(tracks)} tracks written to: {path_to_script}")
+    return track_paths
+
+
+def load_tracks_now(paths_to_track_files, connect, translate, args):
+    '''
+    --load-mode stream: load the tracks into the database (the tables of all of them first, then their trackDb and
+    hgFindSpec entries) without writing any insert files, see loader.load_tracks
+    '''
+    batch_rows = args.batch_rows if args.batch_rows > 1 else loader.DEFAULT_BATCH_ROWS
+    try:
+        loader.load_tracks(paths_to_track_files, connect, args.load_jobs, translate, args.staging, batch_rows)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    for path_to_track_files in paths_to_track_files: # with the checksums taken while streaming, for run.sh
+        verify.write_checks(path_to_track_files, verify.checked_tables(path_to_track_files))
+
+
+def main(args):
+    '''
+    exeute functions
+    '''
+    if not os.path.exists("./UCSC_files"):
+        os.mkdir("./UCSC_files")
+    gzip_io.set_decompressor(args.decompressor)
+    instrument.configure_from_args(args)
+    mirror_cache.configure_from_args(args)
+    if args.load_mode == 'stream':
+        connect, translate = loader.connector_from_args(args) # asks for the password before the long part
+    if args.profile == 'bigbed':
+        track_paths = register_file_tracks(args)
+    elif args.manifest:
+        track_paths = run_batch(args)
+    else:
+        with instrument.stage("download organism files", database=args.d):
+            get_organism_files(args.d, args.base_path, args.workers)
+        track_paths = [process_track(args.name, args.d, args)]
+    try:
+        if args.load_mode == 'stream':
+            load_tracks_now(track_paths, connect, translate, args)
+    finally:
+        if args.stats:
+            instrument.print_summary()
+    return True
+
+
+def build_parser():
+    '''
+    the command line, a sub command for each of PROFILES sharing the options of the pipeline
+    '''
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-d", help="UCSC database name eg. hg38")
+    common.add_argument("--dbms", help="DBMS - Database management system (mariadb on poitin, mysql on baileys)")
+    common.add_argument("--ask-password", action="store_true", help="run.sh runs the client with -p, asking for the root password")
+    common.add_argument("--base-path", default=download_manager.UCSC_BASE_PATH, help="goldenPath URL to download from (any HTTP server with the same layout)")
+    common.add_argument("--workers", type=int, default=download_manager.DEFAULT_WORKERS, help="number of files downloaded at once")
+    common.add_argument("-v", "--verbose", action="store_true", help="print the trackDb entries as they are matched")
+    common.add_argument("--load-mode", choices=LOAD_MODES, default='inserts', help="inserts - write and run <table>_inserts.sql files, load-data - bulk load each .txt.gz with LOAD DATA LOCAL INFILE and skip the insert files, stream - load the track now over a database connection (see --host, --user, --sqlite ...) without writing insert files")
+    common.add_argument("--engine", choices=ENGINES, default='schema', help="how insert statements are generated. schema writes typed, exactly escaped values from the tables CREATE TABLE. line writes the older all-string SQL")
+    common.add_argument("--decompressor", choices=gzip_io.DECOMPRESSORS, default='auto', help="how .txt.gz files are read. auto uses pigz, then python-isal, then the gzip module, whichever is installed first")
+    common.add_argument("--compress-inserts", action="store_true", help="write gzipped <table>_inserts.sql.gz files instead of plain SQL")
+    common.add_argument("--diff", action="store_true", help="only load what changed since the last load (snapshots are kept next to the insert files)")
+    common.add_argument("--defer-indexes", action="store_true", help="create the tables without their secondary indexes and add them once the rows are loaded, all tables at once")
+    common.add_argument("--batch-rows", type=int, default=1, help=f"rows per INSERT statement. Values above 1 write extended inserts (eg. {DEFAULT_BATCH_ROWS})")
+    common.add_argument("--max-allowed-packet", type=int, default=DEFAULT_MAX_ALLOWED_PACKET, help="max_allowed_packet of the target server in bytes. Extended inserts are kept below this size")
+    common.add_argument("--load-jobs", type=int, default=loader.DEFAULT_JOBS, help="with --load-mode stream, number of tables loaded at once (one connection each)")
+    loader.add_connection_arguments(common)
+    mirror_cache.add_arguments(common)
+    instrument.add_arguments(common)
+
+    batch = argparse.ArgumentParser(add_help=False)
+    batch.add_argument("--manifest", help="file listing tracks to add in one batch, one per line as <name> or <db> <name>")
+    batch.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of tracks processed at once in batch mode")
+
+    parser = argparse.ArgumentParser(description="add or update a track on GWIPS-viz from its UCSC counterpart")
+    profiles = parser.add_subparsers(dest="profile", required=True)
+
+    generic = profiles.add_parser('generic', parents=[common, batch], help="a UCSC table (and any tables named <table>*)")
+    generic.add_argument("-t", dest="name", help="Tracks table name on UCSC")
+
+    gencode = profiles.add_parser('gencode', parents=[common, batch], help="every table of a GENCODE release")
+    gencode.add_argument("-g", dest="name", help="Gencode version to add (eg. 41 or M25)")
+
+    bigbed = profiles.add_parser('bigbed', parents=[common], help="a track whose data is a bigBed/bigWig file in gbdb")
+    bigbed.add_argument("-t", dest="name", help="Tracks table name on UCSC")
+    bigbed.add_argument("-u", help="URL to file on gbdb (ftp:// URLs are fetched over https)")
+    bigbed.add_argument("-o", help="path to oragnsim Db in gbdb on host server (default: the directory the file is in on UCSC, under --gbdb-root)")
+    bigbed.add_argument("--gbdb-root", default=gbdb_files.GBDB_ROOT, help="gbdb on this server")
+    bigbed.add_argument("--manifest", help="file listing tracks to register in one batch, one per line as [<db>] <table> <url> [<gbdb directory>]")
+    return parser
+
+
+def parse_args(argv=None):
+    '''
+    parse and check the command line (sys.argv by default)
+    '''
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.decompressor != 'auto' and args.decompressor not in gzip_io.available_decompressors():
+        parser.error(f"--decompressor {args.decompressor} is not installed here")
+    if not args.manifest and not (args.name and args.d):
+        parser.error("-d and the track (-t or -g), or --manifest, are required")
+    if args.profile == 'bigbed' and not args.manifest and not args.u:
+        parser.error("-u, or --manifest, is required")
+    return args
+
+
+if __name__ == "__main__":
+    main(parse_args())
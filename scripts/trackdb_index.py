@@ -0,0 +1,138 @@
+'''
+Persistent index of the entries in an organisms trackDb.txt.gz and hgFindSpec.txt.gz
+
+The first time a file is used it is decompressed once to a .txt copy next to it (eg. UCSC_files/hg38/trackDb.txt)
+while the byte offset and length of every entry is recorded against its first column (tableName for trackDb,
+searchName for hgFindSpec) in a .index.json file. Later runs look entries up in the index and iter_entries reads
+only those byte ranges from the .txt copy, one entry at a time.
+
+An entry is one row of the table. Values holding newlines (the settings and html of trackDb) escape them with a
+backslash, so a row continues onto the next line while a line ends in an escaped newline. The blank line after
+each trackDb entry is the newline that ends a row whose settings end in an escaped newline.
+
+The index remembers the size and mtime of the .txt.gz it was built from. wget --timestamping and rsync both
+set the mtime of the download to that of the remote file, so a new UCSC release invalidates the index and it
+is rebuilt on next use.
+'''
+
+import json
+import os
+
+import gzip_io
+import ucsc_schema
+
+# bump when the layout of the index file changes so old indexes are rebuilt
+INDEX_VERSION = 2
+
+
+def get_cache_paths(path_to_txt_gz):
+    '''
+    return the paths of the decompressed copy and the index file kept next to path_to_txt_gz
+    '''
+    base_path = path_to_txt_gz[:-len('.txt.gz')] if path_to_txt_gz.endswith('.txt.gz') else path_to_txt_gz
+    return f"{base_path}.txt", f"{base_path}.index.json"
+
+
+def get_source_signature(path_to_txt_gz):
+    '''
+    size and mtime of the downloaded file. A change in either means UCSC has published a new version
+    '''
+    stat = os.stat(path_to_txt_gz)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def iter_entry_spans(binary_lines):
+    '''
+    yield (key, offset, length) for each entry (row) in an iterable of raw lines, joining lines that end in an escaped newline
+    '''
+    offset = 0
+    entry_start = 0
+    key = None
+    for line in binary_lines:
+        if key is None:
+            entry_start = offset
+            key = line.rstrip(b'\n').split(b'\t')[0]
+        offset += len(line)
+        if not ucsc_schema.ends_in_escape(line.rstrip(b'\n')):
+            yield key, entry_start, offset - entry_start
+            key = None
+    if key is not None:
+        yield key, entry_start, offset - entry_start
+
+
+def build_index(path_to_txt_gz):
+    '''
+    decompress path_to_txt_gz to its .txt copy, record the span of every entry and write the index file
+
+    Both files are written under a temporary name and renamed into place so an interrupted build is never used
+    '''
+    path_to_txt, path_to_index = get_cache_paths(path_to_txt_gz)
+    signature = get_source_signature(path_to_txt_gz)
+
+    entries = {}
+    with gzip_io.open_gz(path_to_txt_gz, 'rb') as f, open(f"{path_to_txt}.tmp", 'wb') as out:
+        def copied_lines():
+            for line in f:
+                out.write(line)
+                yield line
+
+        for key, offset, length in iter_entry_spans(copied_lines()):
+            entries.setdefault(key.decode('ISO-8859-1'), []).append([offset, length])
+        txt_size = out.tell()
+
+    index = {
+        "version": INDEX_VERSION,
+        "source": signature,
+        "txt_size": txt_size,
+        "entries": entries,
+    }
+    with open(f"{path_to_index}.tmp", 'w') as out:
+        json.dump(index, out)
+
+    os.replace(f"{path_to_txt}.tmp", path_to_txt)
+    os.replace(f"{path_to_index}.tmp", path_to_index)
+    return index
+
+
+def load_index(path_to_txt_gz):
+    '''
+    return the index for path_to_txt_gz, rebuilding it if it is missing or was built from a different download
+    '''
+    path_to_txt, path_to_index = get_cache_paths(path_to_txt_gz)
+    try:
+        with open(path_to_index, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = None
+
+    if (
+        index is None
+        or index.get("version") != INDEX_VERSION
+        or index.get("source") != get_source_signature(path_to_txt_gz)
+        or not os.path.exists(path_to_txt)
+        or os.path.getsize(path_to_txt) != index.get("txt_size")
+    ):
+        print(f"Building index for: {path_to_txt_gz}")
+        index = build_index(path_to_txt_gz)
+    return index
+
+
+def iter_entries(path_to_txt_gz, match, encoding='utf-8'):
+    '''
+    yield the values of each entry whose first column satisfies match, in file order, reading one entry at a time
+
+    match - callable taking the key of an entry (tableName or searchName) and returning True to keep it
+    Values are decoded with encoding and keep their escapes as UCSC wrote them (eg. an escaped newline is a
+    backslash followed by a newline)
+    '''
+    index = load_index(path_to_txt_gz)
+    path_to_txt, _ = get_cache_paths(path_to_txt_gz)
+
+    spans = sorted(span for key, key_spans in index["entries"].items() if match(key) for span in key_spans)
+    with open(path_to_txt, 'rb') as f:
+        for offset, length in spans:
+            f.seek(offset)
+            row = f.read(length)
+            if row.endswith(b'\n'):
+                row = row[:-1]
+            yield [value.decode(encoding) for value in ucsc_schema.split_fields(row)]
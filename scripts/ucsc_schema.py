@@ -0,0 +1,405 @@
+'''
+Schema aware insert statements driven by the CREATE TABLE in a UCSC <table>.sql file
+
+UCSC .txt.gz files are SELECT ... INTO OUTFILE dumps: tab separated, \\N for NULL and backslash escapes for
+backslash, NUL, and tabs or newlines inside a value (a backslash followed by the real character). Those escapes
+mean the same thing inside a MariaDB string literal, so a value can be written between single quotes as it is,
+only escaping the quote character. Nothing is stripped or rewritten and the loaded data is byte for byte what
+UCSC published.
+
+Numeric columns (from the column types in the CREATE TABLE) are written unquoted so the server does not have to
+cast every chromStart/chromEnd, everything else is written as an escaped string literal. Files are handled as
+bytes throughout and the statements are preceded by SET NAMES binary so the server stores the bytes of text and
+blob columns without converting them.
+
+Most rows have no NULLs, quotes or escapes, and those are formatted with one bytes % operation from a template
+built for the table (see row_formatter). Only the others go value by value through to_literal. Whole files go
+further (write_table_insert_statements): a chunk of the .txt.gz with no backslash or quote at all is split into
+its values and formatted with one % of the template repeated for every row of the chunk. The checksum verify.py
+checks the loaded tables with can be taken on the way (new_checksum), so the file is not read again for it.
+'''
+
+import re
+import zlib
+
+import gzip_io
+
+NUMBER = 'number'
+STRING = 'string'
+
+NUMERIC_TYPES = {'tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'float', 'double', 'real', 'decimal', 'numeric'}
+
+# floating point columns, whose stored value a literal cannot be compared with exactly (a FLOAT is single
+# precision, so `value` <=> 0.1 never matches) and which the server prints its own way
+INEXACT_TYPES = {'float', 'double', 'real'}
+
+NUMERIC_VALUE = re.compile(rb'[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?')
+
+# the values of one column of a chunk, each followed by a newline, all NUMERIC_VALUE. Written so that a value
+# can only match one way, or a column that does not match would backtrack through every split of its digits
+NUMERIC_COLUMN = re.compile(rb'(?:[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?\n)*')
+
+HEADER = b'SET NAMES binary;\n'
+
+# escape sequences of a dump besides backslash followed by the character itself (as LOAD DATA reads them)
+DUMP_ESCAPES = {b'0': b'\x00', b'b': b'\b', b'n': b'\n', b'r': b'\r', b't': b'\t', b'Z': b'\x1a'}
+
+ESCAPED = re.compile(rb'\\(.)', re.DOTALL)
+
+
+def parse_create_table(path_to_sql):
+    '''
+    return [(column name, column type)] in table order from the CREATE TABLE statement in a UCSC .sql file
+
+    the type is the lower case base type without its size or attributes, eg. int for int(10) unsigned
+    '''
+    with open(path_to_sql, 'r', encoding='ISO-8859-1') as f:
+        create_table = f.read().split('CREATE TABLE', 1)[1].split('\n', 1)[1] # skip the CREATE TABLE `name` ( line
+    return [(name, column_type.lower()) for name, column_type in re.findall(r'^\s+`([^`]+)`\s+(\w+)', create_table, re.MULTILINE)]
+
+
+def split_secondary_indexes(path_to_sql):
+    '''
+    return (the .sql with its CREATE TABLE stripped of its secondary indexes, [their definitions]) from a UCSC .sql file
+
+    Secondary indexes are the plain, FULLTEXT and SPATIAL KEYs, the ones DISABLE KEYS would also put off. The
+    PRIMARY KEY and UNIQUE keys stay so the rows are still checked as they load, as does a KEY on an
+    auto_increment column (which the table cannot be created without)
+    '''
+    with open(path_to_sql, 'r', encoding='ISO-8859-1') as f:
+        head, create_table = f.read().split('CREATE TABLE', 1)
+    create_line, body = create_table.split('\n', 1)
+    lines = body.split('\n')
+    end = next(i for i, line in enumerate(lines) if line.startswith(')'))
+    auto_increment = set(re.findall(r'^\s+`([^`]+)`.*\bauto_increment\b', '\n'.join(lines[:end]), re.MULTILINE | re.IGNORECASE))
+
+    kept = []
+    indexes = []
+    for line in lines[:end]:
+        definition = line.rstrip().rstrip(',')
+        first_column = re.search(r'\(\s*`([^`]+)`', definition)
+        if re.match(r'\s+(FULLTEXT |SPATIAL )?(KEY|INDEX)\b', definition, re.IGNORECASE) and not (first_column and first_column.group(1) in auto_increment):
+            indexes.append(definition.strip())
+        else:
+            kept.append(definition)
+    return head + 'CREATE TABLE' + create_line + '\n' + ',\n'.join(kept) + '\n' + '\n'.join(lines[end:]), indexes
+
+
+def column_kind(column_type):
+    '''
+    NUMBER or STRING for a base column type from parse_create_table
+    '''
+    if column_type in NUMERIC_TYPES:
+        return NUMBER
+    return STRING
+
+
+def get_column_kinds(path_to_sql):
+    '''
+    the kind of every column of a table, in order
+    '''
+    return [column_kind(column_type) for _, column_type in parse_create_table(path_to_sql)]
+
+
+def split_fields(row):
+    '''
+    split one raw row (bytes) on the tabs that separate values, leaving escaped tabs inside their value
+    '''
+    if b'\\' not in row:
+        return row.split(b'\t')
+
+    fields = []
+    start = 0
+    i = 0
+    while i < len(row):
+        byte = row[i:i + 1]
+        if byte == b'\\':
+            i += 2
+            continue
+        if byte == b'\t':
+            fields.append(row[start:i])
+            start = i + 1
+        i += 1
+    fields.append(row[start:])
+    return fields
+
+
+def ends_in_escape(line):
+    '''
+    True if line ends with an odd number of backslashes, ie. its newline is part of the value
+    '''
+    return (len(line) - len(line.rstrip(b'\\'))) % 2 == 1
+
+
+def iter_row_blocks(path_to_txt_gz):
+    '''
+    yield the rows of a .txt.gz as chunks of whole lines (bytes ending in a newline) where a chunk holds no
+    backslash, so that every line is a row without escapes, and otherwise one row at a time as iter_raw_rows does
+    '''
+    pending = b''
+    for chunk in gzip_io.read_chunks(path_to_txt_gz):
+        if not pending and b'\\' not in chunk:
+            yield chunk
+            continue
+        for line in chunk[:-1].split(b'\n'):
+            line = pending + line
+            if ends_in_escape(line):
+                pending = line + b'\n'
+                continue
+            pending = b''
+            yield split_fields(line)
+    if pending:
+        yield split_fields(pending)
+
+
+def iter_raw_rows(path_to_txt_gz):
+    '''
+    yield each row of a .txt.gz as a list of raw (still escaped) byte values
+
+    rows that contain escaped newlines span several lines of the file and are joined back together. Chunks
+    without any backslash are split with plain bytes.split
+    '''
+    for block in iter_row_blocks(path_to_txt_gz):
+        if isinstance(block, bytes):
+            for line in block[:-1].split(b'\n'):
+                yield line.split(b'\t')
+        else:
+            yield block
+
+
+def chunk_values(chunk, kinds):
+    '''
+    the raw values of every row of a chunk from iter_row_blocks in one flat list, each row followed by a b'\\n'
+    item, or None unless every row has a value for each of kinds, none of them empty, the values of NUMBER
+    columns are all numbers and there is no quote in the chunk (the rows row_formatter formats with its template)
+    '''
+    if b"'" in chunk:
+        return None
+    column_count = len(kinds)
+    values = chunk.replace(b'\n', b'\t\n\t').split(b'\t')
+    del values[-1]
+    rows = chunk.count(b'\n')
+    # every row has column_count values if and only if the newlines all land after one
+    if len(values) != rows * (column_count + 1) or values[column_count::column_count + 1].count(b'\n') != rows or b'' in values:
+        return None
+    for position, kind in enumerate(kinds):
+        if kind == NUMBER and not NUMERIC_COLUMN.fullmatch(b'\n'.join(values[position::column_count + 1]) + b'\n'):
+            return None
+    return values
+
+
+def unescape(value):
+    '''
+    the bytes a raw dump value stands for, None for \\N
+    '''
+    if b'\\' not in value:
+        return value
+    if value == b'\\N':
+        return None
+    return ESCAPED.sub(lambda match: DUMP_ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def to_literal(value, kind):
+    '''
+    SQL literal for one raw dump value of a column of the given kind
+    '''
+    if value == b'\\N':
+        return b'NULL'
+    if kind == NUMBER and NUMERIC_VALUE.fullmatch(value):
+        return value
+    return b"'" + value.replace(b"'", b"\\'") + b"'"
+
+
+def row_to_values(row, kinds):
+    '''
+    the VALUES tuple for one row. Columns beyond the known kinds are written as strings
+    '''
+    return b'(' + b','.join([to_literal(value, kinds[i] if i < len(kinds) else STRING) for i, value in enumerate(row)]) + b')'
+
+
+def row_formatter(kinds):
+    '''
+    return a function that turns a row into its VALUES tuple like row_to_values, but faster
+
+    A row with the expected number of values is formatted in one go with a template like (%b,'%b',%b) and
+    the result is only kept if it holds no backslash (NULL or an escape) and no quote other than the templates
+    own, no value was empty and the values of numeric columns are numbers (anything else is quoted by
+    to_literal). Anything else falls back to row_to_values.
+    '''
+    template = b'(' + b','.join(b'%b' if kind == NUMBER else b"'%b'" for kind in kinds) + b')'
+    quotes = template.count(b"'")
+    column_count = len(kinds)
+    number_positions = [i for i, kind in enumerate(kinds) if kind == NUMBER]
+    is_number = NUMERIC_VALUE.fullmatch
+
+    def format_row(row):
+        if len(row) == column_count and b'' not in row and all([is_number(row[i]) for i in number_positions]):
+            values = template % tuple(row)
+            if b'\\' not in values and values.count(b"'") == quotes:
+                return values
+        return row_to_values(row, kinds)
+
+    return format_row
+
+
+def row_to_condition(row, column_names, kinds):
+    '''
+    WHERE clause matching one row exactly (NULL safe), for DELETE statements
+    '''
+    return b' AND '.join(f'`{name}` <=> '.encode() + to_literal(value, kind) for name, kind, value in zip(column_names, kinds, row))
+
+
+def new_checksum(positions=None):
+    '''
+    a running row count and checksum of raw rows (see verify.py), over the values at positions (all of them if None)
+    '''
+    return {"positions": positions, "rows": 0, "checksum": 0}
+
+
+def add_rows_to_checksum(checksum, rows):
+    '''
+    add raw rows (lists of raw values) to a checksum from new_checksum: the sum of the CRC32 of each row, taken
+    over its values as they are stored (escapes undone, \\N for NULL) joined by tabs
+    '''
+    positions = checksum["positions"]
+    total = 0
+    count = 0
+    for row in rows:
+        if positions is not None:
+            row = [row[position] for position in positions]
+        joined = b'\t'.join(row)
+        if b'\\' in joined:
+            joined = b'\t'.join([b'\\N' if value is None else value for value in map(unescape, row)])
+        total += zlib.crc32(joined)
+        count += 1
+    checksum["rows"] += count
+    checksum["checksum"] += total
+
+
+def add_chunk_to_checksum(checksum, chunk, values=None):
+    '''
+    add the rows of a chunk from iter_row_blocks (no escapes) to a checksum from new_checksum, with its values
+    from chunk_values if it has them
+    '''
+    positions = checksum["positions"]
+    lines = chunk[:-1].split(b'\n')
+    if positions is None: # rows are checked as they are
+        checksum["checksum"] += sum(map(zlib.crc32, lines))
+    elif values is not None: # each checked column across the rows, zipped back into rows
+        width = len(values) // len(lines)
+        checksum["checksum"] += sum(map(zlib.crc32, map(b'\t'.join, zip(*[values[position::width] for position in positions]))))
+    else:
+        add_rows_to_checksum(checksum, (line.split(b'\t') for line in lines))
+        return
+    checksum["rows"] += len(lines)
+
+
+def write_batches(outfile, prefix, values, batch_rows, max_allowed_packet, final=False):
+    '''
+    write extended inserts of batch_rows VALUES tuples at a time, fewer when the statement would pass
+    max_allowed_packet. Returns the tuples left over for a batch that is not full yet, unless final
+    '''
+    start = 0
+    while len(values) - start >= batch_rows or (final and start < len(values)):
+        batch = values[start:start + batch_rows]
+        if len(prefix) + sum(map(len, batch)) + len(batch) + 1 > max_allowed_packet:
+            # as many tuples as fit, at least one
+            size = len(prefix)
+            for count, tuple_values in enumerate(batch):
+                if count and size + len(tuple_values) + 2 > max_allowed_packet:
+                    break
+                size += len(tuple_values) + 1
+            else:
+                count = len(batch)
+            batch = batch[:count]
+        outfile.write(prefix + b','.join(batch) + b';\n')
+        start += len(batch)
+    return values[start:]
+
+
+def write_table_insert_statements(outfile, path_to_txt_gz, table_name, kinds, batch_rows=1, max_allowed_packet=16 * 1024 * 1024, checksum=None):
+    '''
+    write the same statements as write_insert_statements for every row of a .txt.gz and return the number of rows written
+
+    Chunks accepted by chunk_values are formatted all at once, with the row template of row_formatter repeated
+    for every row, the rest row by row
+    checksum - from new_checksum, the rows are added to it on the way
+    '''
+    prefix = f'INSERT INTO `{table_name}` VALUES '.encode()
+    format_row = row_formatter(kinds)
+    template = b'(' + b','.join(b'%b' if kind == NUMBER else b"'%b'" for kind in kinds) + b')'
+    row_count = 0
+    if batch_rows <= 1:
+        statement = prefix + template + b';%b'
+        for block in iter_row_blocks(path_to_txt_gz):
+            if isinstance(block, bytes):
+                values = chunk_values(block, kinds)
+                rows = block.count(b'\n')
+                if values is not None:
+                    outfile.write((statement * rows) % tuple(values))
+                else:
+                    outfile.write(b''.join(prefix + format_row(line.split(b'\t')) + b';\n' for line in block[:-1].split(b'\n')))
+                if checksum is not None:
+                    add_chunk_to_checksum(checksum, block, values)
+                row_count += rows
+            else:
+                outfile.write(prefix + format_row(block) + b';\n')
+                if checksum is not None:
+                    add_rows_to_checksum(checksum, [block])
+                row_count += 1
+        return row_count
+
+    outfile.write(f'LOCK TABLES `{table_name}` WRITE;\n'.encode())
+    outfile.write(f'ALTER TABLE `{table_name}` DISABLE KEYS;\n'.encode())
+    pending = []
+    for block in iter_row_blocks(path_to_txt_gz):
+        if isinstance(block, bytes):
+            values = chunk_values(block, kinds)
+            if values is not None:
+                pending.extend(((template + b'%b') * block.count(b'\n') % tuple(values))[:-1].split(b'\n'))
+            else:
+                pending.extend(format_row(line.split(b'\t')) for line in block[:-1].split(b'\n'))
+            if checksum is not None:
+                add_chunk_to_checksum(checksum, block, values)
+            row_count += block.count(b'\n')
+        else:
+            pending.append(format_row(block))
+            if checksum is not None:
+                add_rows_to_checksum(checksum, [block])
+            row_count += 1
+        if len(pending) >= batch_rows:
+            pending = write_batches(outfile, prefix, pending, batch_rows, max_allowed_packet)
+    write_batches(outfile, prefix, pending, batch_rows, max_allowed_packet, final=True)
+    outfile.write(f'ALTER TABLE `{table_name}` ENABLE KEYS;\n'.encode())
+    outfile.write(b'UNLOCK TABLES;\n')
+    return row_count
+
+
+def write_insert_statements(outfile, rows, table_name, kinds, batch_rows=1, max_allowed_packet=16 * 1024 * 1024):
+    '''
+    write typed insert statements for rows (from iter_raw_rows) to the open binary outfile and return the number of rows written
+
+    batch_rows above 1 writes extended inserts no larger than max_allowed_packet, wrapped in LOCK TABLES and
+    DISABLE KEYS like the other engines
+    '''
+    prefix = f'INSERT INTO `{table_name}` VALUES '.encode()
+    format_row = row_formatter(kinds)
+    row_count = 0
+    if batch_rows <= 1:
+        for row in rows:
+            outfile.write(prefix + format_row(row) + b';\n')
+            row_count += 1
+        return row_count
+
+    outfile.write(f'LOCK TABLES `{table_name}` WRITE;\n'.encode())
+    outfile.write(f'ALTER TABLE `{table_name}` DISABLE KEYS;\n'.encode())
+    pending = []
+    for row in rows:
+        pending.append(format_row(row))
+        row_count += 1
+        if len(pending) >= batch_rows:
+            pending = write_batches(outfile, prefix, pending, batch_rows, max_allowed_packet)
+    write_batches(outfile, prefix, pending, batch_rows, max_allowed_packet, final=True)
+    outfile.write(f'ALTER TABLE `{table_name}` ENABLE KEYS;\n'.encode())
+    outfile.write(b'UNLOCK TABLES;\n')
+    return row_count
@@ -0,0 +1,246 @@
+'''
+Check that the tables in the database hold exactly the rows of the UCSC files they were loaded from
+
+The row count and an order independent checksum of every .txt.gz are recorded in build_manifest.json while it
+is read anyway, to write its inserts (schema engine), diff it (table_diff.table_digest) or stream it into the
+database (loader.stream_table). record_source_checksums reads the files that were not, eg. in load-data mode
+without --diff. The checksum is the sum of the CRC32 of every row,
+taken over its values as they are stored (escapes undone) joined by tabs, with \\N for NULL. The database can
+compute the same sum itself in one scan without sending any rows back:
+
+SELECT COUNT(*), SUM(CRC32(CONCAT_WS(CHAR(9), IFNULL(`col1`, '\\N'), ...))) FROM `table`
+
+(CHECKSUM TABLE depends on the row format of the server, so it cannot be worked out from the .txt.gz.) The
+count is checked first, a truncated load is reported without scanning for the checksum. float and double
+columns are left out of the checksum as the server prints them its own way (1 for 1.0), they are still counted.
+
+The checks are run by loader.py after the tables load (and before --staging swaps them in), by run.sh once it
+has loaded everything (verify.sql and verify_expected.tsv written next to it) and by this script, for a load
+done some other way. Each table that differs is named with the rows and checksum expected and found. Tables
+loaded from the SQL of the line engine are not checked, it does not load the values as they are.
+
+Example
+python scripts/verify.py UCSC_files/hg38_knownGene --user root -p
+'''
+
+import argparse
+import os
+import sqlite3
+import sys
+import zlib
+
+import build_manifest
+import instrument
+import loader
+import ucsc_schema
+
+CHECK_SQL_NAME = "verify.sql"
+EXPECTED_NAME = "verify_expected.tsv"
+
+# column types left out of the checksum
+UNCHECKED_TYPES = {'float', 'double', 'real'}
+
+
+def get_checked_columns(path_to_track_files, table_name):
+    '''
+    [(position, column name)] of the columns of a table that go into its checksum
+    '''
+    columns = ucsc_schema.parse_create_table(f"{path_to_track_files}/{table_name}.sql")
+    return [(position, name) for position, (name, column_type) in enumerate(columns) if column_type not in UNCHECKED_TYPES]
+
+
+def checked_tables(path_to_track_files):
+    '''
+    the tables planned in the load_plan.json of a track directory that are checked once loaded (not those loaded
+    from the SQL of the line engine, see loader.write_load_plan)
+    '''
+    return [table["name"] for table in loader.read_load_plan(path_to_track_files)["tables"] if table.get("verify", True)]
+
+
+def new_table_checksum(path_to_track_files, table_name):
+    '''
+    an empty checksum (ucsc_schema.new_checksum) over the checked columns of a table, for the passes that read
+    its .txt.gz anyway to add the rows to (the schema engine, table_diff.table_digest, loader.stream_table)
+    '''
+    positions = [position for position, _ in get_checked_columns(path_to_track_files, table_name)]
+    if len(positions) == len(ucsc_schema.parse_create_table(f"{path_to_track_files}/{table_name}.sql")):
+        positions = None # every column, rows are joined as they are
+    return ucsc_schema.new_checksum(positions)
+
+
+def save_table_checksum(path_to_track_files, table_name, checksum):
+    '''
+    record a checksum of every row of the .txt.gz of a table in the build manifest
+    '''
+    path_to_txt_gz = f"{path_to_track_files}/{table_name}.txt.gz"
+    build_manifest.record_checksum(path_to_track_files, table_name, path_to_txt_gz, checksum["rows"], checksum["checksum"])
+
+
+def source_checksum(path_to_txt_gz, positions=None):
+    '''
+    (rows, checksum) of a .txt.gz over the values at positions (all of them if None), see the module docstring
+    '''
+    checksum = ucsc_schema.new_checksum(positions)
+    for block in ucsc_schema.iter_row_blocks(path_to_txt_gz):
+        if isinstance(block, bytes):
+            ucsc_schema.add_chunk_to_checksum(checksum, block)
+        else:
+            ucsc_schema.add_rows_to_checksum(checksum, [block])
+    return checksum["rows"], checksum["checksum"]
+
+
+def record_source_checksums(path_to_track_files, table_names):
+    '''
+    record the row count and checksum of the .txt.gz of each table in the build manifest, unless they were
+    already recorded for the same file (usually while it was read to write its inserts, diff it or stream it).
+    Returns the number of rows read
+    '''
+    rows_read = 0
+    for table_name in table_names:
+        path_to_txt_gz = f"{path_to_track_files}/{table_name}.txt.gz"
+        if build_manifest.get_checksum(path_to_track_files, table_name, path_to_txt_gz) is not None:
+            continue
+        checksum = new_table_checksum(path_to_track_files, table_name)
+        checksum["rows"], checksum["checksum"] = source_checksum(path_to_txt_gz, checksum["positions"])
+        save_table_checksum(path_to_track_files, table_name, checksum)
+        rows_read += checksum["rows"]
+    return rows_read
+
+
+def checksum_query(table_name, column_names, sqlite=False):
+    '''
+    the SELECT returning the name, row count and checksum of a table
+    '''
+    if sqlite: # no CONCAT_WS or escapes in literals, CRC32 is registered by table_checksum
+        row = " || char(9) || ".join(f"IFNULL(`{name}`, '\\N')" for name in column_names)
+    else:
+        row = "CONCAT_WS(CHAR(9), " + ", ".join(f"IFNULL(`{name}`, '\\\\N')" for name in column_names) + ")"
+    return f"SELECT '{table_name}', COUNT(*), SUM(CRC32({row})) FROM `{table_name}`"
+
+
+def crc32_of_value(value):
+    '''
+    CRC32 for SQLite, of the latin-1 bytes of text as the loader stores them
+    '''
+    if isinstance(value, str):
+        value = value.encode('latin-1')
+    elif not isinstance(value, bytes):
+        value = str(value).encode('latin-1')
+    return zlib.crc32(value)
+
+
+def table_checksum(connection, table_name, column_names):
+    '''
+    (rows, checksum) of a table in the database, checksum None for an empty table
+    '''
+    sqlite = isinstance(connection, sqlite3.Connection)
+    if sqlite:
+        connection.create_function("CRC32", 1, crc32_of_value, deterministic=True)
+    cursor = connection.cursor()
+    cursor.execute(checksum_query(table_name, column_names, sqlite))
+    _, rows, checksum = cursor.fetchone()
+    cursor.close()
+    return rows, None if checksum is None else int(checksum)
+
+
+def write_checks(path_to_track_files, table_names):
+    '''
+    write verify.sql and the output it should give (verify_expected.tsv) for run.sh to check the tables with the client,
+    or remove them when there is nothing to check
+    '''
+    queries = []
+    expected = []
+    for table_name in table_names:
+        recorded = build_manifest.get_checksum(path_to_track_files, table_name, f"{path_to_track_files}/{table_name}.txt.gz")
+        if recorded is None:
+            continue
+        queries.append(checksum_query(table_name, [name for _, name in get_checked_columns(path_to_track_files, table_name)]))
+        expected.append(f"{table_name}\t{recorded['rows']}\t{recorded['checksum'] if recorded['rows'] else 'NULL'}\n")
+    if not queries:
+        for name in (CHECK_SQL_NAME, EXPECTED_NAME):
+            if os.path.exists(f"{path_to_track_files}/{name}"):
+                os.remove(f"{path_to_track_files}/{name}")
+        return
+    with open(f"{path_to_track_files}/{CHECK_SQL_NAME}", 'w') as f:
+        f.write("".join(f"{query};\n" for query in queries))
+    with open(f"{path_to_track_files}/{EXPECTED_NAME}", 'w') as f:
+        f.write("".join(expected))
+
+
+def verify_table(connection, path_to_track_files, table_name, loaded_name=None):
+    '''
+    compare a table in the database with the recorded count and checksum of its .txt.gz
+
+    loaded_name - the table the rows are in, if not table_name (eg. its --staging shadow table)
+    Returns None if they match (or nothing was recorded), otherwise what differs
+    '''
+    recorded = build_manifest.get_checksum(path_to_track_files, table_name, f"{path_to_track_files}/{table_name}.txt.gz")
+    if recorded is None:
+        return None
+    loaded_name = loaded_name or table_name
+
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM `{loaded_name}`")
+    rows = cursor.fetchone()[0]
+    cursor.close()
+    if rows != recorded["rows"]:
+        return f"{recorded['rows']} rows expected, {rows} loaded"
+    if rows == 0:
+        return None
+    _, checksum = table_checksum(connection, loaded_name, [name for _, name in get_checked_columns(path_to_track_files, table_name)])
+    if checksum != recorded["checksum"]:
+        return f"{rows} rows as expected but checksum {checksum} instead of {recorded['checksum']}, some rows differ"
+    return None
+
+
+def verify_tracks(paths_to_files, connect):
+    '''
+    check every table planned in the load_plan.json of each track directory. Returns {(db, table): what differs}
+    '''
+    connection = connect()
+    differences = {}
+    try:
+        for path_to_files in paths_to_files:
+            plan = loader.read_load_plan(path_to_files)
+            loader.use_database(connection, plan["database"])
+            for table in plan["tables"]:
+                if not table.get("verify", True):
+                    print(f"{plan['database']}.{table['name']}: loaded from the SQL of the line engine, not checked")
+                    continue
+                difference = verify_table(connection, path_to_files, table["name"])
+                if difference:
+                    differences[(plan["database"], table["name"])] = difference
+    finally:
+        connection.close()
+    return differences
+
+
+def main(args):
+    '''
+    check the track directories, exiting with an error naming the tables that differ
+    '''
+    connect, _ = loader.connector_from_args(args)
+    instrument.configure_from_args(args)
+    try:
+        with instrument.stage("verification", tracks=len(args.paths)):
+            differences = verify_tracks(args.paths, connect)
+    finally:
+        if args.stats:
+            instrument.print_summary()
+    for (db_name, table_name), difference in sorted(differences.items()):
+        print(f"{db_name}.{table_name}: {difference}")
+    if differences:
+        sys.exit(f"{len(differences)} tables differ from the UCSC files they were loaded from")
+    print("All tables match the UCSC files they were loaded from")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="check loaded tables against the .txt.gz files they came from")
+
+    parser.add_argument("paths", nargs='+', help="track directories written by track_update.py (eg. UCSC_files/hg38_knownGene)")
+    loader.add_connection_arguments(parser)
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args()
+    main(args)
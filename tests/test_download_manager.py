@@ -0,0 +1,71 @@
+import hashlib
+import http.server
+import threading
+from email.utils import formatdate
+
+import pytest
+
+import download_manager
+
+DATA = bytes(range(256)) * 4096
+MTIME = 1700000000
+
+
+class TruncatingHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    serves a database directory with one file, whose first GET is cut off half way through the body
+    '''
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def send_file_headers(self, status, length, extra=()):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Last-Modified", formatdate(MTIME, usegmt=True))
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.send_file_headers(200, len(DATA))
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("Range")))
+        if self.path in ("/db", "/db/"):
+            body = b'<a href="t.txt.gz">t.txt.gz</a> <a href="md5sum.txt">md5sum.txt</a>'
+        elif self.path == "/db/md5sum.txt":
+            body = f"{hashlib.md5(DATA).hexdigest()}  t.txt.gz\n".encode()
+        elif self.headers.get("Range"):
+            start = int(self.headers["Range"][len("bytes="):-1])
+            self.send_file_headers(206, len(DATA) - start, [("Content-Range", f"bytes {start}-{len(DATA) - 1}/{len(DATA)}")])
+            self.wfile.write(DATA[start:])
+            return
+        else:
+            self.send_file_headers(200, len(DATA))
+            self.wfile.write(DATA[:len(DATA) // 2])
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TruncatingHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    TruncatingHandler.requests = []
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_a_truncated_body_is_resumed(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_manager.time, "sleep", lambda seconds: None)
+    assert download_manager.download_matching_files(f"{server}/db", ["t.*"], str(tmp_path)) == ["t.txt.gz"]
+    assert (tmp_path / "t.txt.gz").read_bytes() == DATA
+    assert ("/db/t.txt.gz", f"bytes={len(DATA) // 2}-") in TruncatingHandler.requests
@@ -0,0 +1,12 @@
+import gbdb_files
+
+
+def test_tracks_of_the_same_name_in_two_databases_keep_their_own_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(gbdb_files, "list_track_files", lambda url: [(url.rsplit('/', 1)[1], url)])
+    monkeypatch.setattr(gbdb_files, "sync_file", lambda organism_db, url, path_to_downloads, path_to_gbdb_dir: ({"path_in_gbdb": f"{path_to_gbdb_dir}/{url.rsplit('/', 1)[1]}", "size": 1}, "installed"))
+    tracks = [(organism_db, "foo", f"https://example.org/gbdb/{organism_db}/foo.bb", str(tmp_path / organism_db), str(tmp_path / "gbdb" / organism_db)) for organism_db in ("hg19", "hg38")]
+    records = gbdb_files.sync_files(tracks, workers=2)
+    assert records == {
+        ("hg19", "foo"): [{"path_in_gbdb": str(tmp_path / "gbdb" / "hg19" / "foo.bb"), "size": 1}],
+        ("hg38", "foo"): [{"path_in_gbdb": str(tmp_path / "gbdb" / "hg38" / "foo.bb"), "size": 1}],
+    }
@@ -0,0 +1,76 @@
+import gzip
+import shutil
+
+import pytest
+
+import gzip_io
+
+ROWS = b'585\tchr1\tcaf\xe9\n586\tchr1\t\\N\n' * 1000 + b'587\tchr2\tno newline at the end'
+
+
+def available(name):
+    if name == 'pigz' and shutil.which('pigz') is None:
+        pytest.skip("pigz is not installed")
+    if name == 'isal' and gzip_io.igzip_threaded is None:
+        pytest.skip("python-isal is not installed")
+
+
+@pytest.fixture
+def decompressor(request):
+    available(request.param)
+    gzip_io.set_decompressor(request.param)
+    yield request.param
+    gzip_io.set_decompressor('auto')
+
+
+@pytest.mark.parametrize('decompressor', ['pigz', 'isal', 'python'], indirect=True)
+def test_open_gz(tmp_path, decompressor):
+    path = tmp_path / "table.txt.gz"
+    with gzip.open(path, 'wb') as f:
+        f.write(ROWS)
+    assert gzip_io.get_decompressor() == decompressor
+
+    with gzip_io.open_gz(path) as f:
+        assert f.read() == ROWS
+    with gzip_io.open_gz(path, 'rt', encoding='ISO-8859-1') as f:
+        assert f.readline() == '585\tchr1\tcaf\xe9\n'
+    chunks = list(gzip_io.read_chunks(path, chunk_size=100))
+    assert b''.join(chunks) == ROWS + b'\n'
+    assert all(chunk.endswith(b'\n') and chunk.count(b'\n') for chunk in chunks)
+
+
+@pytest.mark.parametrize('compressor', ['pigz', 'python'])
+def test_open_writer(tmp_path, monkeypatch, compressor):
+    available(compressor)
+    if compressor == 'python':
+        monkeypatch.setattr(gzip_io.shutil, 'which', lambda name: None)
+    path = tmp_path / "table_inserts.sql.gz"
+    with open(path, 'wb') as outfile:
+        outfile.write(gzip.compress(b'already there\n'))
+        with gzip_io.open_writer(outfile, compress=True) as f:
+            f.write(ROWS)
+        with gzip_io.open_writer(outfile, 'w', compress=True, encoding='ISO-8859-1') as f:
+            f.write('caf\xe9\n')
+    # each open_writer adds a gzip member after what the file already had
+    with gzip.open(path, 'rb') as f:
+        assert f.read() == b'already there\n' + ROWS + b'caf\xe9\n'
+
+
+def test_open_writer_without_compression(tmp_path):
+    path = tmp_path / "table_inserts.sql"
+    with open(path, 'wb') as outfile:
+        with gzip_io.open_writer(outfile) as f:
+            f.write(b'INSERT\n')
+        with gzip_io.open_writer(outfile, 'w', encoding='ISO-8859-1') as f:
+            f.write('caf\xe9\n')
+        assert not outfile.closed
+    assert path.read_bytes() == b'INSERT\ncaf\xe9\n'
+    assert gzip_io.sql_suffix(False) == '.sql' and gzip_io.sql_suffix(True) == '.sql.gz'
+
+
+def test_unavailable_decompressor():
+    for name in gzip_io.DECOMPRESSORS:
+        if name != 'auto' and name not in gzip_io.available_decompressors():
+            with pytest.raises(ValueError, match="not available"):
+                gzip_io.set_decompressor(name)
+    assert gzip_io.get_decompressor() == gzip_io.available_decompressors()[0]
@@ -0,0 +1,187 @@
+import gzip
+import json
+import os
+import sqlite3
+
+import pytest
+
+import build_manifest
+import loader
+import table_diff
+import track_update
+import verify
+
+SQL = '''DROP TABLE IF EXISTS `testTable`;
+CREATE TABLE `testTable` (
+  `bin` smallint(5) unsigned NOT NULL,
+  `chrom` varchar(255) NOT NULL,
+  `name` varchar(255) DEFAULT NULL,
+  `blob` longblob,
+  PRIMARY KEY (`chrom`(16),`bin`),
+  KEY `name` (`name`(8))
+) ENGINE=MyISAM DEFAULT CHARSET=latin1;
+'''
+
+ROWS = [b'585\tchr1\tplain\tx',
+        b'586\tchr1\t\\N\tnul\\0byte',
+        b'587\tchr2\tit\'s "q"\ttab\\\there',
+        b'588\tchr2\tnew\\\nline\tback\\\\slash',
+        b'589\tchr3\tcaf\xe9\t\\N']
+
+# what each row should read back as from SQLite
+EXPECTED = [(585, 'chr1', 'plain', 'x'),
+            (586, 'chr1', None, 'nul\x00byte'),
+            (587, 'chr2', 'it\'s "q"', 'tab\there'),
+            (588, 'chr2', 'new\nline', 'back\\slash'),
+            (589, 'chr3', 'caf\xe9', None)]
+
+
+def write_table(path_to_files, table_name="testTable"):
+    with open(path_to_files / f"{table_name}.sql", 'w', encoding='ISO-8859-1') as f:
+        f.write(SQL.replace('testTable', table_name))
+    with gzip.open(path_to_files / f"{table_name}.txt.gz", 'wb') as f:
+        f.write(b'\n'.join(ROWS) + b'\n')
+
+
+def test_iter_statements():
+    lines = ["SET NAMES binary;\n",
+             "INSERT INTO t VALUES ('a;b','multi\n",
+             "line;'),('c\\';d');\n",
+             "/* a ; comment */ DELETE FROM t WHERE a = \"x;\";\n",
+             "CREATE TABLE `we;ird` (\n",
+             "  a int\n",
+             ");\n",
+             "SELECT 1"]
+    assert list(loader.iter_statements(lines)) == [
+        "SET NAMES binary",
+        "INSERT INTO t VALUES ('a;b','multi\nline;'),('c\\';d')",
+        "/* a ; comment */ DELETE FROM t WHERE a = \"x;\"",
+        "CREATE TABLE `we;ird` (\n  a int\n)",
+        "SELECT 1"]
+
+
+def test_to_sqlite():
+    assert loader.to_sqlite("SET NAMES binary") is None
+    assert loader.to_sqlite("LOCK TABLES `t` WRITE") is None
+    assert loader.to_sqlite("ALTER TABLE `t` DISABLE KEYS") is None
+    assert loader.to_sqlite("ALTER TABLE `t`\n  ADD KEY `name` (`name`)") is None
+    assert loader.to_sqlite("INSERT INTO `t` VALUES (1,'it\\'s','a\\tb',\"q\")") == "INSERT INTO `t` VALUES (1,'it''s','a\tb','q')"
+    assert loader.to_sqlite("INSERT INTO `t` VALUES ('a\\0b')") == "INSERT INTO `t` VALUES ('a' || char(0) || 'b')"
+    assert loader.to_sqlite("DELETE FROM `t` WHERE `a` <=> NULL AND `b` <=> 'x' LIMIT 1") == \
+        "DELETE FROM `t` WHERE rowid IN (SELECT rowid FROM `t` WHERE `a` IS NULL AND `b` IS 'x' LIMIT 1)"
+    create_table = loader.to_sqlite(SQL.split(';\n')[1])
+    assert create_table == ("CREATE TABLE `testTable` (\n  `bin` smallint(5)  NOT NULL,\n  `chrom` varchar(255) NOT NULL,\n"
+                            "  `name` varchar(255) DEFAULT NULL,\n  `blob` longblob,\n  PRIMARY KEY (`chrom`,`bin`)\n)")
+
+
+def test_sqlite_round_trip(tmp_path):
+    write_table(tmp_path)
+    track_update.write_table_inserts(str(tmp_path), "testTable")
+    inserted = sqlite3.connect(":memory:")
+    loader.load_file(inserted, str(tmp_path / "testTable.sql"), loader.to_sqlite)
+    loader.load_file(inserted, str(tmp_path / "testTable_inserts.sql"), loader.to_sqlite)
+    streamed = sqlite3.connect(":memory:")
+    loader.load_file(streamed, str(tmp_path / "testTable.sql"), loader.to_sqlite)
+    assert loader.stream_table(streamed, str(tmp_path / "testTable.txt.gz"), "testTable", 2) == len(ROWS)
+
+    for connection in (inserted, streamed):
+        assert connection.execute("SELECT * FROM testTable ORDER BY bin").fetchall() == EXPECTED
+        verify.record_source_checksums(str(tmp_path), ["testTable"])
+        assert verify.verify_table(connection, str(tmp_path), "testTable") is None
+
+
+def test_load_tracks_into_a_new_sqlite_file(tmp_path):
+    organism = tmp_path / "hg38"
+    organism.mkdir()
+    (organism / "trackDb.sql").write_text("DROP TABLE IF EXISTS `trackDb`;\nCREATE TABLE `trackDb` (\n  `tableName` varchar(255) NOT NULL,\n  `settings` longblob NOT NULL,\n  PRIMARY KEY (`tableName`)\n) ENGINE=MyISAM;\n")
+    (organism / "hgFindSpec.sql").write_text("DROP TABLE IF EXISTS `hgFindSpec`;\nCREATE TABLE `hgFindSpec` (\n  `searchName` varchar(255) NOT NULL,\n  KEY `searchName` (`searchName`(16))\n) ENGINE=MyISAM;\n")
+    track = tmp_path / "hg38_testTable"
+    track.mkdir()
+    write_table(track)
+    track_update.write_table_inserts(str(track), "testTable")
+    (track / "trackDb_inserts.sql").write_text('DELETE FROM trackDb WHERE tableName = "testTable";\nINSERT INTO trackDb VALUES ("testTable","nul\\0");\n')
+    (track / "hgFindSpec_inserts.sql").write_text('DELETE FROM hgFindSpec WHERE searchName = "testTable";\nINSERT INTO hgFindSpec VALUES ("testTable");\n')
+    loader.write_load_plan(str(track), "hg38", "*testTable.sql")
+    assert json.loads((track / loader.PLAN_NAME).read_text())["entry_tables"] == {"trackDb": "../hg38/trackDb.sql", "hgFindSpec": "../hg38/hgFindSpec.sql"}
+    verify.record_source_checksums(str(track), ["testTable"])
+
+    path_to_db = str(tmp_path / "new.db")
+    loader.load_tracks([str(track)], loader.sqlite_connector(path_to_db), jobs=2, translate=loader.to_sqlite)
+    connection = sqlite3.connect(path_to_db)
+    assert connection.execute("SELECT * FROM testTable ORDER BY bin").fetchall() == EXPECTED
+    assert connection.execute("SELECT * FROM trackDb").fetchall() == [("testTable", "nul\x00")]
+    assert connection.execute("SELECT * FROM hgFindSpec").fetchall() == [("testTable",)]
+
+
+def test_snapshots_are_promoted_after_verification(tmp_path):
+    write_table(tmp_path)
+    loader.write_load_plan(str(tmp_path), "hg38", "*testTable.sql", 'load-data', {"testTable": table_diff.FULL})
+    (tmp_path / "trackDb_inserts.sql").write_text("")
+    (tmp_path / "hgFindSpec_inserts.sql").write_text("")
+    connect = loader.sqlite_connector(str(tmp_path / "test.db"))
+    connection = connect()
+    connection.execute("CREATE TABLE trackDb (tableName text)")
+    connection.execute("CREATE TABLE hgFindSpec (searchName text)")
+    connection.commit()
+    table_diff.stage_snapshot(str(tmp_path), "testTable", table_diff.table_digest(str(tmp_path / "testTable.txt.gz")))
+    snapshot, _ = table_diff.get_snapshot_paths(str(tmp_path), "testTable")
+
+    path_to_txt_gz = str(tmp_path / "testTable.txt.gz")
+    build_manifest.record_checksum(str(tmp_path), "testTable", path_to_txt_gz, len(ROWS), 1)
+    with pytest.raises(RuntimeError, match="did not load correctly"):
+        loader.load_tracks([str(tmp_path)], connect, translate=loader.to_sqlite)
+    assert not os.path.exists(snapshot)
+
+    build_manifest.record_checksum(str(tmp_path), "testTable", path_to_txt_gz, *verify.source_checksum(path_to_txt_gz))
+    loader.load_tracks([str(tmp_path)], connect, translate=loader.to_sqlite)
+    assert os.path.exists(snapshot)
+
+
+def make_track(tmp_path, load_mode, engine='schema'):
+    write_table(tmp_path)
+    (tmp_path / "trackDb_inserts.sql").write_text("")
+    (tmp_path / "hgFindSpec_inserts.sql").write_text("")
+    loader.write_load_plan(str(tmp_path), "hg38", "*testTable.sql", load_mode, engine=engine)
+    connect = loader.sqlite_connector(str(tmp_path / "test.db"))
+    connection = connect()
+    connection.execute("CREATE TABLE trackDb (tableName text)")
+    connection.execute("CREATE TABLE hgFindSpec (searchName text)")
+    connection.commit()
+    return connect
+
+
+def test_checksums_are_taken_while_reading(tmp_path):
+    path_to_txt_gz = str(tmp_path / "testTable.txt.gz")
+    connect = make_track(tmp_path, 'load-data')
+    expected = verify.source_checksum(path_to_txt_gz)
+
+    loader.load_tracks([str(tmp_path)], connect, translate=loader.to_sqlite)
+    recorded = build_manifest.get_checksum(str(tmp_path), "testTable", path_to_txt_gz)
+    assert (recorded["rows"], recorded["checksum"]) == expected
+
+    for write in (track_update.tables_to_sql_statements, track_update.tables_to_delta_sql_statements):
+        os.remove(tmp_path / build_manifest.MANIFEST_NAME)
+        write(str(tmp_path))
+        recorded = build_manifest.get_checksum(str(tmp_path), "testTable", path_to_txt_gz)
+        assert (recorded["rows"], recorded["checksum"]) == expected
+
+
+def test_line_engine_tables_are_not_verified(tmp_path):
+    connect = make_track(tmp_path, 'inserts', engine='line')
+    (tmp_path / "testTable_inserts.sql").write_text('INSERT INTO testTable VALUES ("585","chr1","N","x");\n') # one row, with \N loaded as N
+    build_manifest.record_checksum(str(tmp_path), "testTable", str(tmp_path / "testTable.txt.gz"), len(ROWS), 1)
+    assert verify.checked_tables(str(tmp_path)) == []
+    verify.write_checks(str(tmp_path), verify.checked_tables(str(tmp_path)))
+    assert not os.path.exists(tmp_path / verify.CHECK_SQL_NAME)
+    loader.load_tracks([str(tmp_path)], connect, translate=loader.to_sqlite)
+
+
+def test_missing_entry_tables_stop_the_load_before_any_table(tmp_path):
+    write_table(tmp_path)
+    (tmp_path / "trackDb_inserts.sql").write_text("")
+    (tmp_path / "hgFindSpec_inserts.sql").write_text("")
+    loader.write_load_plan(str(tmp_path), "hg38", "*testTable.sql", 'load-data')
+    path_to_db = str(tmp_path / "test.db")
+    with pytest.raises(RuntimeError, match="hg38 has no trackDb table"):
+        loader.load_tracks([str(tmp_path)], loader.sqlite_connector(path_to_db), translate=loader.to_sqlite)
+    assert sqlite3.connect(path_to_db).execute("SELECT name FROM sqlite_master").fetchall() == []
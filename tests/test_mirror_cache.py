@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+import mirror_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    mirror_cache.configure(str(tmp_path), max_size=0)
+    yield tmp_path
+    mirror_cache.configure(None)
+
+
+def add_file(cache, key, data=b'x' * 10):
+    os.makedirs(os.path.dirname(cache / key), exist_ok=True)
+    (cache / key).write_bytes(data)
+    (cache / f"{key}.lock").write_text("")
+    return {"size": len(data), "last_used": 1}
+
+
+def test_evict_skips_files_in_use_and_removes_their_locks(cache):
+    index = {key: add_file(cache, key) for key in ("hg38/1/database/a.txt.gz", "hg38/1/database/b.txt.gz")}
+    in_use = mirror_cache.open_locked(str(cache / "hg38/1/database/b.txt.gz.lock"))
+    with in_use:
+        mirror_cache.evict(index, keep=None)
+    assert list(index) == ["hg38/1/database/b.txt.gz"]
+    assert sorted(os.listdir(cache / "hg38/1/database")) == ["b.txt.gz", "b.txt.gz.lock"]
+
+
+def test_a_damaged_index_is_rebuilt(cache):
+    add_file(cache, "hg38/1/database/a.txt.gz", b'abc')
+    (cache / "hg38/1/database/b.txt.gz.part").write_bytes(b'partial')
+    (cache / mirror_cache.INDEX_NAME).write_text('{"hg38/1/database/a.txt.gz": {"si')
+    index = mirror_cache.read_index()
+    assert list(index) == ["hg38/1/database/a.txt.gz"]
+    assert index["hg38/1/database/a.txt.gz"]["size"] == 3
+    mirror_cache.record_use("hg38/1/database/a.txt.gz", 3)
@@ -0,0 +1,69 @@
+import argparse
+import gzip
+import os
+
+import pytest
+
+import track_update
+
+SQL = '''DROP TABLE IF EXISTS `testTable`;
+CREATE TABLE `testTable` (
+  `bin` smallint(5) unsigned NOT NULL,
+  `name` varchar(255) NOT NULL
+) ENGINE=MyISAM DEFAULT CHARSET=latin1;
+'''
+
+
+def test_inserts_are_rebuilt_when_the_schema_changes(tmp_path):
+    (tmp_path / "testTable.sql").write_text(SQL)
+    with gzip.open(tmp_path / "testTable.txt.gz", 'wb') as f:
+        f.write(b'585\t12\n')
+    track_update.tables_to_sql_statements(str(tmp_path))
+    assert b"(585,'12')" in (tmp_path / "testTable_inserts.sql").read_bytes()
+
+    (tmp_path / "testTable.sql").write_text(SQL.replace("`name` varchar(255)", "`name` int(10)"))
+    track_update.tables_to_sql_statements(str(tmp_path))
+    assert b"(585,12)" in (tmp_path / "testTable_inserts.sql").read_bytes()
+
+
+def test_read_manifest(tmp_path):
+    path = tmp_path / "tracks.txt"
+    path.write_text("# GENCODE releases\nV41\n\nmm39 VM30  # mouse\n  hg19 knownGene\n")
+    assert track_update.read_manifest(str(path), "hg38") == [("hg38", "V41"), ("mm39", "VM30"), ("hg19", "knownGene")]
+    with pytest.raises(ValueError, match="no database given for V41"):
+        track_update.read_manifest(str(path))
+
+
+def process_track_in_worker(name, organism_db, args):
+    path_to_track_files = f"./UCSC_files/{organism_db}_{name}"
+    os.makedirs(path_to_track_files)
+    return path_to_track_files, []
+
+
+def test_run_batch_writes_one_loader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("UCSC_files")
+    (tmp_path / "tracks.txt").write_text("knownGene\nmm39 refGene\n")
+    organisms = []
+    def get_organism_files(organism_db, base_path, workers):
+        organisms.append(organism_db)
+        os.makedirs(f"./UCSC_files/{organism_db}")
+        for table_name in ("trackDb", "hgFindSpec"):
+            with gzip.open(f"./UCSC_files/{organism_db}/{table_name}.txt.gz", 'wb') as f:
+                f.write(b'')
+        return f"./UCSC_files/{organism_db}"
+    monkeypatch.setattr(track_update, "get_organism_files", get_organism_files)
+    # a function of this module, so the pool workers can unpickle it
+    monkeypatch.setattr(track_update, "process_track_in_worker", process_track_in_worker)
+    args = argparse.Namespace(manifest=str(tmp_path / "tracks.txt"), d="hg38", base_path=None, workers=1, jobs=2)
+
+    assert track_update.run_batch(args) == ["./UCSC_files/hg38_knownGene", "./UCSC_files/mm39_refGene"]
+    assert organisms == ["hg38", "mm39"]
+    assert (tmp_path / "UCSC_files/tracks_run.sh").read_text() == (
+        "#!/usr/bin/env bash\n"
+        "# This BASH Script adds 2 tracks to GWIPS-viz\n"
+        "set -e\n\n"
+        'echo "Adding knownGene to hg38"\n'
+        f'(cd "{tmp_path}/UCSC_files/hg38_knownGene" && bash run.sh)\n'
+        'echo "Adding refGene to mm39"\n'
+        f'(cd "{tmp_path}/UCSC_files/mm39_refGene" && bash run.sh)\n')
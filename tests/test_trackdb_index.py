@@ -0,0 +1,73 @@
+import gzip
+import os
+
+import trackdb_index
+
+# two entries of the same track (as in trackDb.txt.gz, one per priority) with multi-line html and settings, the
+# blank line after each being the newline that ends a row whose last value ends in an escaped newline
+TRACKDB = (b'knownGene\tgenePred\t1\t<H2>Description</H2>\\\n<P>Genes</P>\\\n\ttrack knownGene\\\nshortLabel Genes\\\n\n'
+           b'refGene\tgenePred\t2\t\tshortLabel RefSeq\n'
+           b'knownGene\tgenePred\t3\tplain\ttrack knownGene\\\n\n')
+
+HGFINDSPEC = b'knownGene\tknownGene\tgenePred\n' + b'refGene\trefGene\tgenePred\n'
+
+
+def write_gz(path, data, mtime):
+    with gzip.open(path, 'wb') as f:
+        f.write(data)
+    os.utime(path, ns=(mtime, mtime))
+    return str(path)
+
+
+def test_entries_span_several_lines(tmp_path):
+    path = write_gz(tmp_path / "trackDb.txt.gz", TRACKDB, 10**18)
+    index = trackdb_index.build_index(path)
+    assert sorted(index["entries"]) == ["knownGene", "refGene"]
+    assert len(index["entries"]["knownGene"]) == 2
+
+    assert list(trackdb_index.iter_entries(path, lambda key: key == "knownGene")) == [
+        ["knownGene", "genePred", "1", "<H2>Description</H2>\\\n<P>Genes</P>\\\n", "track knownGene\\\nshortLabel Genes\\\n"],
+        ["knownGene", "genePred", "3", "plain", "track knownGene\\\n"]]
+    assert list(trackdb_index.iter_entries(path, lambda key: key == "refGene")) == [["refGene", "genePred", "2", "", "shortLabel RefSeq"]]
+
+
+def test_hgfindspec_entries(tmp_path):
+    path = write_gz(tmp_path / "hgFindSpec.txt.gz", HGFINDSPEC, 10**18)
+    assert list(trackdb_index.iter_entries(path, lambda key: key.startswith("ref"))) == [["refGene", "refGene", "genePred"]]
+    assert os.path.exists(tmp_path / "hgFindSpec.txt")
+    assert os.path.exists(tmp_path / "hgFindSpec.index.json")
+
+
+def test_a_new_download_rebuilds_the_index(tmp_path, capsys):
+    path = write_gz(tmp_path / "hgFindSpec.txt.gz", HGFINDSPEC, 10**18)
+    trackdb_index.load_index(path)
+    assert "Building index" in capsys.readouterr().out
+    trackdb_index.load_index(path)
+    assert "Building index" not in capsys.readouterr().out
+
+    write_gz(tmp_path / "hgFindSpec.txt.gz", HGFINDSPEC + b'ensGene\tensGene\tgenePred\n', 2 * 10**18)
+    assert list(trackdb_index.iter_entries(path, lambda key: key == "ensGene")) == [["ensGene", "ensGene", "genePred"]]
+    assert "Building index" in capsys.readouterr().out
+
+    # a damaged copy is rebuilt too
+    with open(tmp_path / "hgFindSpec.txt", 'ab') as f:
+        f.write(b'junk')
+    trackdb_index.load_index(path)
+    assert "Building index" in capsys.readouterr().out
+
+
+def test_trackDb_inserts_keep_multi_line_html(tmp_path):
+    import track_update
+
+    path = write_gz(tmp_path / "trackDb.txt.gz", TRACKDB, 10**18)
+    track = tmp_path / "hg38_refGene"
+    track.mkdir()
+    (track / "refGene.txt.gz").write_bytes(b'')
+    profile = track_update.get_profile('generic', 'knownGene')
+    track_update.get_trackDb_entries_as_insert_statements(str(track), path, profile)
+    statements = (track / "trackDb_inserts.sql").read_text(encoding=track_update.ENTRY_ENCODING).split(';\n')
+    inserts = [statement for statement in statements if statement.startswith('INSERT')]
+    # both knownGene entries (whole, with their html) and the refGene one of the downloaded table
+    assert [insert.split('"')[1] for insert in inserts] == ["knownGene", "refGene", "knownGene"]
+    assert all(insert.count('","') == 20 for insert in inserts)
+    assert '"<H2>Description</H2>\n <P>Genes</P>\n ","track knownGene\n shortLabel Genes\n "' in inserts[0]
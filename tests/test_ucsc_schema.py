@@ -0,0 +1,160 @@
+import gzip
+import io
+
+import pytest
+
+import ucsc_schema
+
+SQL = '''DROP TABLE IF EXISTS `testTable`;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `testTable` (
+  `id` int(10) unsigned NOT NULL auto_increment,
+  `bin` smallint(5) unsigned NOT NULL,
+  `chrom` varchar(255) NOT NULL,
+  `score` float NOT NULL,
+  `name` varchar(255) DEFAULT NULL,
+  `blob` longblob NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `name` (`name`),
+  KEY `id_chrom` (`id`,`chrom`),
+  KEY `chrom` (`chrom`(14),`bin`),
+  INDEX `score` (`score`),
+  FULLTEXT KEY `blob` (`blob`)
+) ENGINE=MyISAM AUTO_INCREMENT=3 DEFAULT CHARSET=latin1 COMMENT='caf\xe9';
+'''
+
+KINDS = [ucsc_schema.NUMBER, ucsc_schema.NUMBER, ucsc_schema.STRING, ucsc_schema.NUMBER, ucsc_schema.STRING, ucsc_schema.STRING]
+
+
+@pytest.fixture
+def table(tmp_path):
+    '''
+    write testTable.sql and return a function writing testTable.txt.gz from raw lines
+    '''
+    with open(tmp_path / "testTable.sql", 'w', encoding='ISO-8859-1') as f:
+        f.write(SQL)
+
+    def write_rows(data):
+        with gzip.open(tmp_path / "testTable.txt.gz", 'wb') as f:
+            f.write(data)
+        return tmp_path / "testTable.txt.gz"
+
+    return write_rows
+
+
+def test_parse_create_table(tmp_path, table):
+    columns = ucsc_schema.parse_create_table(tmp_path / "testTable.sql")
+    assert columns == [('id', 'int'), ('bin', 'smallint'), ('chrom', 'varchar'), ('score', 'float'), ('name', 'varchar'), ('blob', 'longblob')]
+    assert ucsc_schema.get_column_kinds(tmp_path / "testTable.sql") == KINDS
+
+
+def test_null():
+    assert ucsc_schema.unescape(b'\\N') is None
+    assert ucsc_schema.to_literal(b'\\N', ucsc_schema.STRING) == b'NULL'
+    assert ucsc_schema.to_literal(b'\\N', ucsc_schema.NUMBER) == b'NULL'
+    assert ucsc_schema.row_formatter(KINDS)([b'1', b'2', b'chr1', b'0.5', b'\\N', b'x']) == b"(1,2,'chr1',0.5,NULL,'x')"
+    # an escaped backslash followed by N is a value, not NULL
+    assert ucsc_schema.unescape(b'\\\\N') == b'\\N'
+    assert ucsc_schema.to_literal(b'\\\\N', ucsc_schema.STRING) == b"'\\\\N'"
+
+
+def test_escaped_tab_and_newline(table):
+    path = table(b"1\t585\tchr1\t0.5\ttab\\\there\tnew\\\nline\n2\t586\tchr2\t1\tb\tc\n")
+    rows = list(ucsc_schema.iter_raw_rows(path))
+    assert rows == [[b'1', b'585', b'chr1', b'0.5', b'tab\\\there', b'new\\\nline'], [b'2', b'586', b'chr2', b'1', b'b', b'c']]
+    assert ucsc_schema.unescape(rows[0][4]) == b'tab\there'
+    assert ucsc_schema.unescape(rows[0][5]) == b'new\nline'
+    assert ucsc_schema.row_formatter(KINDS)(rows[0]) == b"(1,585,'chr1',0.5,'tab\\\there','new\\\nline')"
+
+
+def test_trailing_backslash(table):
+    # an escaped backslash at the end of a value ends the row, a single one carries it onto the next line
+    assert not ucsc_schema.ends_in_escape(b'1\t585\tchr1\t0.5\tname\tx\\\\')
+    assert ucsc_schema.ends_in_escape(b'1\t585\tchr1\t0.5\tname\tx\\\\\\')
+    path = table(b"1\t585\tchr1\t0.5\tname\tx\\\\\n2\t586\tchr2\t1\tb\tend\\\n")
+    rows = list(ucsc_schema.iter_raw_rows(path))
+    assert rows == [[b'1', b'585', b'chr1', b'0.5', b'name', b'x\\\\'], [b'2', b'586', b'chr2', b'1', b'b', b'end\\\n']]
+    assert ucsc_schema.unescape(rows[0][5]) == b'x\\'
+    assert ucsc_schema.to_literal(rows[0][5], ucsc_schema.STRING) == b"'x\\\\'"
+
+
+def test_latin1_bytes(table):
+    path = table(b"1\t585\tchr1\t0.5\tcaf\xe9\t\xff\x00\n")
+    rows = list(ucsc_schema.iter_raw_rows(path))
+    assert rows == [[b'1', b'585', b'chr1', b'0.5', b'caf\xe9', b'\xff\x00']]
+    outfile = io.BytesIO()
+    ucsc_schema.write_table_insert_statements(outfile, path, 'testTable', KINDS)
+    assert outfile.getvalue() == b"INSERT INTO `testTable` VALUES (1,585,'chr1',0.5,'caf\xe9','\xff\x00');\n"
+
+
+def test_quotes_and_empty_values():
+    format_row = ucsc_schema.row_formatter(KINDS)
+    assert format_row([b'1', b'2', b"it's", b'', b'"q"', b'']) == b"(1,2,'it\\'s','','\"q\"','')"
+
+
+@pytest.mark.parametrize("value", [b'1 OR 1', b'abc', b'0x1F', b'1e'])
+def test_non_numeric_value_in_a_number_column(value):
+    format_row = ucsc_schema.row_formatter([ucsc_schema.NUMBER, ucsc_schema.STRING])
+    assert format_row([value, b'x']) == ucsc_schema.row_to_values([value, b'x'], [ucsc_schema.NUMBER, ucsc_schema.STRING]) == b"('" + value + b"','x')"
+    assert format_row([b'-1.5e3', b'x']) == b"(-1.5e3,'x')"
+
+
+@pytest.mark.parametrize("batch_rows, max_allowed_packet", [(1, 16 * 1024 * 1024), (2, 16 * 1024 * 1024), (1000, 120), (3, 1)])
+def test_chunks_and_rows_write_the_same(table, batch_rows, max_allowed_packet):
+    clean = b"".join(b"%d\t585\tchr1\t0.5\tname%d\tx\n" % (i, i) for i in range(50))
+    path = table(clean + b"50\t586\tchr2\t1\t\\N\tit's\n51\t587\tchr3\t2\tnew\\\nline\tz\n" + clean)
+    by_rows = io.BytesIO()
+    by_chunks = io.BytesIO()
+    rows = ucsc_schema.write_insert_statements(by_rows, ucsc_schema.iter_raw_rows(path), 'testTable', KINDS, batch_rows, max_allowed_packet)
+    assert ucsc_schema.write_table_insert_statements(by_chunks, path, 'testTable', KINDS, batch_rows, max_allowed_packet) == rows == 102
+    assert by_chunks.getvalue() == by_rows.getvalue()
+
+
+@pytest.mark.parametrize("positions", [None, [0, 1, 2, 4, 5]])
+@pytest.mark.parametrize("extra", [b"", b"50\t586\tchr2\t1\tq\tit's\n", b"50\t586\tchr2\t1\t\\N\tnew\\\nline\n"])
+def test_checksum_while_writing(table, positions, extra):
+    clean = b"".join(b"%d\t585\tchr1\t0.5\tname%d\tx\n" % (i, i) for i in range(50))
+    path = table(clean + extra + clean)
+    expected = ucsc_schema.new_checksum(positions)
+    ucsc_schema.add_rows_to_checksum(expected, ucsc_schema.iter_raw_rows(path))
+    for batch_rows in (1, 7):
+        checksum = ucsc_schema.new_checksum(positions)
+        ucsc_schema.write_table_insert_statements(io.BytesIO(), path, 'testTable', KINDS, batch_rows, checksum=checksum)
+        assert checksum == expected
+    assert expected["rows"] == 100 + bool(extra)
+
+
+def test_chunk_values_needs_whole_rows():
+    kinds = [ucsc_schema.NUMBER, ucsc_schema.STRING]
+    assert ucsc_schema.chunk_values(b"1\ta\n2\tb\n", kinds) == [b'1', b'a', b'\n', b'2', b'b', b'\n']
+    # the right number of values overall, but not in every row
+    assert ucsc_schema.chunk_values(b"1\ta\tx\n2\n", kinds) is None
+    assert ucsc_schema.chunk_values(b"1\t\n2\tb\n", kinds) is None
+    assert ucsc_schema.chunk_values(b"1\tit's\n", kinds) is None
+    # a value of a number column that is not a number
+    assert ucsc_schema.chunk_values(b"1\ta\n1 OR 1\tb\n", kinds) is None
+    assert ucsc_schema.chunk_values(b"1\ta\nabc\tb\n", kinds) is None
+
+
+@pytest.mark.parametrize("batch_rows", [1, 5])
+def test_non_numeric_values_write_the_same_by_chunks_and_rows(table, batch_rows):
+    clean = b"".join(b"%d\t585\tchr1\t0.5\tname%d\tx\n" % (i, i) for i in range(20))
+    path = table(clean + b"21\t1 OR 1\tchr1\tabc\tname\tx\n" + clean)
+    by_rows = io.BytesIO()
+    by_chunks = io.BytesIO()
+    ucsc_schema.write_insert_statements(by_rows, ucsc_schema.iter_raw_rows(path), 'testTable', KINDS, batch_rows)
+    ucsc_schema.write_table_insert_statements(by_chunks, path, 'testTable', KINDS, batch_rows)
+    assert by_chunks.getvalue() == by_rows.getvalue()
+    assert b"(21,'1 OR 1','chr1','abc','name','x')" in by_chunks.getvalue()
+
+
+def test_split_secondary_indexes(tmp_path, table):
+    sql, indexes = ucsc_schema.split_secondary_indexes(tmp_path / "testTable.sql")
+    assert indexes == ["KEY `chrom` (`chrom`(14),`bin`)", "INDEX `score` (`score`)", "FULLTEXT KEY `blob` (`blob`)"]
+    assert "PRIMARY KEY (`id`)" in sql
+    assert "UNIQUE KEY `name` (`name`)" in sql
+    # the table cannot be created without a key starting with its auto_increment column
+    assert "KEY `id_chrom` (`id`,`chrom`)\n) ENGINE=MyISAM" in sql
+    assert "KEY `chrom`" not in sql
+    assert sql.startswith("DROP TABLE IF EXISTS `testTable`;")
+    assert sql.endswith("COMMENT='caf\xe9';\n")